@@ -1,51 +1,77 @@
 import os
+import json
+import uuid
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException, status
+import itertools
+import string
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from fastapi import FastAPI, HTTPException, Header, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Literal
+from typing import AsyncIterator, Dict, List, Literal, Optional, Sequence, Tuple
 import uvicorn
 from langchain_openai import ChatOpenAI
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, message_to_dict, messages_from_dict
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.graph import StateGraph, MessagesState, START, END
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.prebuilt import create_react_agent
 from langgraph_supervisor import create_supervisor
-from openai import OpenAI
-from langchain_core.tools import tool
-from langchain_community.tools import DuckDuckGoSearchRun
+from langchain_core.tools import BaseTool, tool
 from langsmith import Client as LangSmithClient
 from langsmith import traceable
 from langsmith.wrappers import wrap_openai
+from providers import registry
+from rate_limit import limiters, TokenUsageCallback
+from search import search, asearch
+from meta_search import meta_search as run_meta_search, ameta_search, META_SEARCH_PROVIDERS
+from local_kb import local_kb
+from llm_cache import llm_cache, llm_cache_bypass
+from metrics import metrics
+from search_cache import search_cache
+from semantic_cache import semantic_cache
+from hedging import hedge_stats
+from stage_memo import stage_memo, memo_key
+from checkpoints import open_checkpointer, checkpoint_stats
+from health import health
+from research import gather_evidence, render_evidence
+from speculation import SpeculativePrefetch, SPECULATION_ENABLED, speculation_stats
+from surrogate import surrogate, predict_fuel_properties, SurrogatePrediction, TARGET_STAGE
+from model_profiles import ModelProfile, DEFAULT_PRESET, get_preset
+import mass_balance
+from batch_engine import run_batch
+from workflow_state import FuelComposition, StageOutput, CompositionState, STAGE_OUTPUT_PROMPT, BOOKKEEPING_FIELDS
 
+logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client and LLM
+# OpenAI key for the chat models
 openai_key = os.environ.get("OPENAI_API_KEY")
 if not openai_key:
     logger.error("OPENAI_API_KEY environment variable is not set")
     raise ValueError("OPENAI_API_KEY environment variable is not set")
 
-llm = ChatOpenAI(
-    openai_api_key=openai_key,
-    model="gpt-4.1",
-    temperature=0,
-    top_p=1,
-    frequency_penalty=0,
-    presence_penalty=0
-)
-
-llm_o3 = ChatOpenAI(
-    openai_api_key=openai_key,
-    model="o3"
-)
-
-client = OpenAI(api_key=openai_key)
-
-# Pydantic models
-class FuelComposition(BaseModel):
-    calorific_value: float
-    moisture: float
-    chlorine: float
-    ash: float
-    particle_size_uniformity: float
-
+@lru_cache(maxsize=None)
+def get_llm(profile: ModelProfile) -> ChatOpenAI:
+    """
+    Chat model for a model profile; identical profiles share one instance.
+    Args:
+        profile (ModelProfile): Model, reasoning effort, token cap, timeout and sampling parameters.
+    Returns:
+        ChatOpenAI: The configured model using the shared pools, rate limiter and LLM cache.
+    """
+    limiter = limiters[f"openai:{profile.model}"]
+    return ChatOpenAI(
+        openai_api_key=openai_key,
+        **profile.model_dump(exclude_none=True),
+        http_client=registry.http_client("openai"),
+        http_async_client=registry.async_http_client("openai"),
+        rate_limiter=limiter,
+        callbacks=[TokenUsageCallback(limiter)],
+        cache=llm_cache,
+    )
 
 # Tools
 @tool
@@ -55,21 +81,29 @@ def search_engine_openai(query: str):
     Args:
         query (str): The query to search for.
     Returns:
-        str: The search results.
+        str: The answer text followed by its sources.
     """
     logger.info(f"Executing OpenAI search for query: {query}")
     try:
-        response = client.responses.create(
-            model="gpt-4o",
-            tools=[{"type": "web_search_preview", "search_context_size": "high"}],
-            input=query,
-        )
+        response = search("openai", query).render()
         logger.info("OpenAI search completed successfully")
         return response
     except Exception as e:
         logger.error(f"OpenAI search failed: {str(e)}")
         raise
 
+async def _asearch_engine_openai(query: str):
+    logger.info(f"Executing async OpenAI search for query: {query}")
+    try:
+        response = (await asearch("openai", query)).render()
+        logger.info("OpenAI search completed successfully")
+        return response
+    except Exception as e:
+        logger.error(f"OpenAI search failed: {str(e)}")
+        raise
+
+search_engine_openai.coroutine = _asearch_engine_openai
+
 @tool
 def search_engine_duckduckgo(query: str):
     """
@@ -77,18 +111,29 @@ def search_engine_duckduckgo(query: str):
     Args:
         query (str): The query to search for.
     Returns:
-        str: The search results.
+        str: The answer text followed by its sources.
     """
     logger.info(f"Executing DuckDuckGo search for query: {query}")
     try:
-        search = DuckDuckGoSearchRun()
-        response = search.run(query)
+        response = search("duckduckgo", query).render()
         logger.info("DuckDuckGo search completed successfully")
         return response
     except Exception as e:
         logger.error(f"DuckDuckGo search failed: {str(e)}")
         raise
 
+async def _asearch_engine_duckduckgo(query: str):
+    logger.info(f"Executing async DuckDuckGo search for query: {query}")
+    try:
+        response = (await asearch("duckduckgo", query)).render()
+        logger.info("DuckDuckGo search completed successfully")
+        return response
+    except Exception as e:
+        logger.error(f"DuckDuckGo search failed: {str(e)}")
+        raise
+
+search_engine_duckduckgo.coroutine = _asearch_engine_duckduckgo
+
 @tool
 def exa_search(query: str):
     """
@@ -96,34 +141,191 @@ def exa_search(query: str):
     Args:
         query (str): The query to search for.
     Returns:
-        str: The search results.
+        str: The answer text followed by its sources.
     """
     logger.info(f"Executing Exa search for query: {query}")
     try:
-        info_dict = {}
-        client = OpenAI(
-            base_url="https://api.exa.ai",
-            api_key="d0881403-d07a-449d-a79e-0b653bf2c3f5"
-        )
-        completion = client.chat.completions.create(
-            model="exa-pro",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": query}
-            ],
-            extra_body={"text": False}
-        )
-        info_dict['content'] = completion.choices[0].message.content if completion.choices else "No content found."
-        info_dict['citations'] = completion.choices[0].message.citations if completion.choices else "No citations found."
+        response = search("exa", query).render()
         logger.info("Exa search completed successfully")
-        return info_dict
+        return response
     except Exception as e:
         logger.error(f"Exa search failed: {str(e)}")
         raise
 
+async def _aexa_search(query: str):
+    logger.info(f"Executing async Exa search for query: {query}")
+    try:
+        response = (await asearch("exa", query)).render()
+        logger.info("Exa search completed successfully")
+        return response
+    except Exception as e:
+        logger.error(f"Exa search failed: {str(e)}")
+        raise
+
+exa_search.coroutine = _aexa_search
+
+@tool
+def meta_search(query: str):
+    """
+    Search OpenAI's web search, Exa and DuckDuckGo concurrently and return one merged result.
+    Answers are de-duplicated and citations are merged by URL. Prefer this over calling the individual search tools one by one.
+    Args:
+        query (str): The query to search for.
+    Returns:
+        str: The merged answers followed by their sources.
+    """
+    logger.info(f"Executing meta search for query: {query}")
+    try:
+        response = run_meta_search(query).render()
+        logger.info("Meta search completed successfully")
+        return response
+    except Exception as e:
+        logger.error(f"Meta search failed: {str(e)}")
+        raise
+
+async def _ameta_search(query: str):
+    logger.info(f"Executing async meta search for query: {query}")
+    try:
+        response = (await ameta_search(query)).render()
+        logger.info("Meta search completed successfully")
+        return response
+    except Exception as e:
+        logger.error(f"Meta search failed: {str(e)}")
+        raise
+
+meta_search.coroutine = _ameta_search
+
+@tool
+def local_kb_search(query: str):
+    """
+    Search our local reference library (material calorific values, PVC chlorine content, typical recovery rates, etc.).
+    Answers in milliseconds; call it before any web search tool.
+    Args:
+        query (str): The query to search for.
+    Returns:
+        str: The best matching reference passages followed by their source files.
+    """
+    logger.info(f"Executing local knowledge base search for query: {query}")
+    try:
+        response = local_kb.search(query).render()
+        logger.info("Local knowledge base search completed successfully")
+        return response
+    except Exception as e:
+        logger.error(f"Local knowledge base search failed: {str(e)}")
+        raise
+
+# An empty knowledge base would only cost every agent turn an extra round-trip, so it is offered only with content
+kb_tools = [local_kb_search] if local_kb.n_passages else []
+research_tools = kb_tools + [meta_search, search_engine_duckduckgo, exa_search, search_engine_openai]
+
+# The providers each web search tool queries, so speculative prefetches can be matched to agent searches
+SEARCH_TOOL_PROVIDERS = {
+    meta_search.name: META_SEARCH_PROVIDERS,
+    search_engine_duckduckgo.name: ["duckduckgo"],
+    exa_search.name: ["exa"],
+    search_engine_openai.name: ["openai"],
+}
+
+@tool
+def remove_fraction(composition: Dict[str, float], category: str, pct: float):
+    """
+    Remove a percentage of one component from a waste composition and renormalize to 100%.
+    Use this instead of calculating the new composition by hand.
+    Args:
+        composition (Dict[str, float]): The current composition, component name to percentage.
+        category (str): The component to remove from.
+        pct (float): The percentage of that component that is removed (0-100).
+    Returns:
+        str: A mass balance table with the removed and remaining mass and the new composition.
+    """
+    logger.info(f"Removing {pct}% of {category}")
+    try:
+        return mass_balance.remove_fraction(composition, category, pct).render()
+    except Exception as e:
+        logger.error(f"Mass balance failed: {str(e)}")
+        raise
+
+@tool
+def apply_removal_efficiencies(composition: Dict[str, float], efficiencies: Dict[str, float]):
+    """
+    Apply one stage's removal efficiencies to a waste composition and renormalize to 100%.
+    Use this instead of calculating the new composition by hand.
+    Args:
+        composition (Dict[str, float]): The current composition, component name to percentage.
+        efficiencies (Dict[str, float]): Component name to the percentage of it that is removed (0-100).
+    Returns:
+        str: A mass balance table with the removed and remaining mass and the new composition.
+    """
+    logger.info(f"Applying removal efficiencies {efficiencies}")
+    try:
+        return mass_balance.apply_removal_efficiencies(composition, efficiencies).render()
+    except Exception as e:
+        logger.error(f"Mass balance failed: {str(e)}")
+        raise
+
+@tool
+def normalize(composition: Dict[str, float]):
+    """
+    Normalize a waste composition so it sums to exactly 100%.
+    Args:
+        composition (Dict[str, float]): Component name to percentage or mass.
+    Returns:
+        str: Each component with its normalized percentage.
+    """
+    logger.info(f"Normalizing composition of {len(composition)} components")
+    try:
+        normalized = mass_balance.normalize(composition)
+    except Exception as e:
+        logger.error(f"Normalization failed: {str(e)}")
+        raise
+    return "\n".join(f"{name}: {round(value, mass_balance.PRECISION):g}%" for name, value in normalized.items())
+
+@tool
+def mass_balance_report(composition: Dict[str, float], stages: Dict[str, Dict[str, float]]):
+    """
+    Mass balance across several process stages applied in order, with the overall yield on the original feed.
+    Args:
+        composition (Dict[str, float]): The feed composition, component name to percentage.
+        stages (Dict[str, Dict[str, float]]): Stage name to its removal efficiencies, in process order.
+    Returns:
+        str: One mass balance table per stage, then the overall yield and final composition.
+    """
+    logger.info(f"Building mass balance report for stages {list(stages)}")
+    try:
+        return mass_balance.mass_balance_report(composition, list(stages.items()))
+    except Exception as e:
+        logger.error(f"Mass balance failed: {str(e)}")
+        raise
+
+@tool
+def batch_mass_balance(compositions: List[Dict[str, float]], stages: Dict[str, Dict[str, float]]):
+    """
+    Run many waste compositions through the same stages' removal efficiencies at once.
+    Args:
+        compositions (List[Dict[str, float]]): Feed compositions, component name to percentage.
+        stages (Dict[str, Dict[str, float]]): Stage name to component name to the percentage removed (0-100).
+            Known stages (bulky_removal, magnetic_separation, eddy_current_separation, glass_separation,
+            chlorine_reduction, fine_metal_removal) run in process order.
+    Returns:
+        str: The mass yield and final composition of each feed composition.
+    """
+    logger.info(f"Running batch mass balance for {len(compositions)} compositions through {list(stages)}")
+    try:
+        result = run_batch(compositions, stages)
+    except Exception as e:
+        logger.error(f"Batch mass balance failed: {str(e)}")
+        raise
+    return "\n".join(
+        f"[{i}] yield {round(mass_yield, mass_balance.PRECISION):g}%: "
+        + ", ".join(f"{name} {round(value, mass_balance.PRECISION):g}%" for name, value in composition.items())
+        for i, (mass_yield, composition) in enumerate(zip(result.mass_yield.tolist(), result.to_dicts()), 1)
+    )
+
+mass_balance_tools = [remove_fraction, apply_removal_efficiencies, normalize, mass_balance_report, batch_mass_balance]
+
 
 # Sorting Supervisor Agent
-sorting_supervisor_prompt = f"""
+sorting_supervisor_prompt = """
 Role: As a highly experienced Sorting Supervisor specializing in municipal solid waste (MSW) processing, your primary responsibility is to identify and remove large, non-processable items from MSW at a processing plant in {place}. Your tasks include:
 
 Instructions: - Research and understand the process of removing large, non-processable items from MSW in {place}, utilizing available tools to gather detailed insights.
@@ -131,9 +333,15 @@ Instructions: - Research and understand the process of removing large, non-proce
  - Adjust the waste composition by reducing the percentage of the relevant category to account for the removal of large, non-processable items, ensuring only appropriate components are removed as per the process.
 
 Tools: You have access to the following tools:
+ - **local_kb_search**: Searches our local reference library of stable data (calorific values, chlorine content, recovery rates). Always call it first and use the web search tools only for what it does not cover.
+ - **meta_search**: Searches OpenAI's web search, DuckDuckGo and Exa at once and returns merged, de-duplicated results. Prefer it over calling the engines one by one.
  - **search_engine_openai**: For searching and retrieving information from OpenAI's web search tool.
  - **search_engine_duckduckgo**: For searching and retrieving information from DuckDuckGo's search engine.
  - **exa_search**: For searching and retrieving information from Exa's search engine.
+ - **remove_fraction** / **apply_removal_efficiencies**: Apply the removal percentages you determined to the composition and return the exact new composition normalized to 100%. Never recalculate percentages by hand.
+ - **normalize**: Normalize a composition to exactly 100%.
+ - **mass_balance_report**: Mass balance table across several removal steps, with the overall yield.
+ - **batch_mass_balance**: Run many compositions (e.g. seasonal or scenario variants) through the same removal efficiencies at once.
 
 **Mandatory Tool Usage**: For all data related to {place}'s MSW, including the percentage of non-processable waste, categories of large non-processable items, and the removal process, you MUST use the provided tools to fetch the most recent and accurate information. Do not rely solely on internal knowledge.
 - The % of non processable waste in {place}'s Municipal Solid Waste.
@@ -155,12 +363,6 @@ NOTE: - No waste category is considered for recycling or composting in this task
  - You are only bound to remove large, non-processable items from the waste composition. Do not remove any other components.
  - If you are removing certain percentage of a component from the waste composition, please mention the percentage removed and Make sure the new waste composition is accurate and normalized to 100%.
 """
-sorting_supervisor_agent = create_react_agent(
-    model=llm,
-    tools=[search_engine_duckduckgo, exa_search, search_engine_openai],
-    name="sorting_supervisor",
-    prompt=sorting_supervisor_prompt
-)
 
     # Sorting Engineer Agent
 sorting_engineer_prompt = """
@@ -172,9 +374,15 @@ Instructions: - Mechanical sorting is a critical step in the RDF production proc
  - Utilize available tools to analyze the provided waste composition and the RDF production process, evaluating how mechanical sorting affects the composition.
 
 Tools: You have access to the following tools:
+ - **local_kb_search**: Searches our local reference library of stable data (calorific values, chlorine content, recovery rates). Always call it first and use the web search tools only for what it does not cover.
+ - **meta_search**: Searches OpenAI's web search, DuckDuckGo and Exa at once and returns merged, de-duplicated results. Prefer it over calling the engines one by one.
  - **search_engine_openai**: For searching and retrieving information from OpenAI's web search tool.
  - **search_engine_duckduckgo**: For searching and retrieving information from DuckDuckGo's search engine.
  - **exa_search**: For searching and retrieving information from Exa's search engine.
+ - **remove_fraction** / **apply_removal_efficiencies**: Apply the removal percentages you determined to the composition and return the exact new composition normalized to 100%. Never recalculate percentages by hand.
+ - **normalize**: Normalize a composition to exactly 100%.
+ - **mass_balance_report**: Mass balance table across several removal steps, with the overall yield.
+ - **batch_mass_balance**: Run many compositions (e.g. seasonal or scenario variants) through the same removal efficiencies at once.
 
 **Mandatory Tool Usage**: For all data related to {place}'s MSW you MUST use the provided tools to fetch the most recent and accurate information. Do not rely solely on internal knowledge.
 - To understand to precision of removal of glass and metal removal using the seperation process of mechincal sorting.
@@ -193,12 +401,6 @@ Note: - Verify that no components are removed unless explicitly required by the
  - Remove components that the mechanical sorting process is supposed to remove, including metals, glass, and aggregates.
  - Make sure the new waste composition is accurate and normalized to 100%.
 """
-sorting_engineer_agent = create_react_agent(
-    model=llm,
-    tools=[search_engine_duckduckgo, exa_search, search_engine_openai],
-    name="sorting_engineer",
-    prompt=sorting_engineer_prompt
-)
 
     # Chlorine Reduction Specialist Agent
 chlorine_reduction_specialist_prompt = """
@@ -211,9 +413,15 @@ Instructions: - The Chlorine Specialist uses provided tools to validate efficacy
    2. **Assess Chlorine Content**: Use the tools to determine the chlorine content in the waste stream, particularly focusing on the plastic category and any other relevant categories.
 
 Tools: You have access to the following tools:
+ - **local_kb_search**: Searches our local reference library of stable data (calorific values, chlorine content, recovery rates). Always call it first and use the web search tools only for what it does not cover.
+ - **meta_search**: Searches OpenAI's web search, DuckDuckGo and Exa at once and returns merged, de-duplicated results. Prefer it over calling the engines one by one.
  - **search_engine_openai**: For searching and retrieving information from OpenAI's web search tool.
  - **search_engine_duckduckgo**: For searching and retrieving information from DuckDuckGo's search engine.
  - **exa_search**: For searching and retrieving information from Exa's search engine.
+ - **remove_fraction** / **apply_removal_efficiencies**: Apply the removal percentages you determined to the composition and return the exact new composition normalized to 100%. Never recalculate percentages by hand.
+ - **normalize**: Normalize a composition to exactly 100%.
+ - **mass_balance_report**: Mass balance table across several removal steps, with the overall yield.
+ - **batch_mass_balance**: Run many compositions (e.g. seasonal or scenario variants) through the same removal efficiencies at once.
 
 **Mandatory Tool Usage**: For all data related to {place}'s MSW you MUST use the provided tools to fetch the most recent and accurate information. Do not rely solely on internal knowledge.
  - The % of PVC available in the plastic category.
@@ -222,12 +430,6 @@ Tools: You have access to the following tools:
 Note: - The source links should also be returned along with the information.
  - Make sure the new waste composition is accurate and normalized to 100%.
 """
-chlorine_reduction_specialist_agent = create_react_agent(
-    model=llm,
-    tools=[search_engine_duckduckgo, exa_search, search_engine_openai],
-    name="chlorine_reduction_specialist",
-    prompt=chlorine_reduction_specialist_prompt
-)
 
     # Shredding Purification Technician Agent
 shredding_purification_technician_prompt = """
@@ -240,9 +442,15 @@ Instruction: - Research and understand the composition of the waste and what wou
  - The final waste composition after removal, ensuring all listed components are considered and no components are removed unless specified by the process.
 
 Tools: You have access to the following tools:
+ - **local_kb_search**: Searches our local reference library of stable data (calorific values, chlorine content, recovery rates). Always call it first and use the web search tools only for what it does not cover.
+ - **meta_search**: Searches OpenAI's web search, DuckDuckGo and Exa at once and returns merged, de-duplicated results. Prefer it over calling the engines one by one.
  - **search_engine_openai**: For searching and retrieving information from OpenAI's web search tool.
  - **search_engine_duckduckgo**: For searching and retrieving information from DuckDuckGo's search engine.
  - **exa_search**: For searching and retrieving information from Exa's search engine.
+ - **remove_fraction** / **apply_removal_efficiencies**: Apply the removal percentages you determined to the composition and return the exact new composition normalized to 100%. Never recalculate percentages by hand.
+ - **normalize**: Normalize a composition to exactly 100%.
+ - **mass_balance_report**: Mass balance table across several removal steps, with the overall yield.
+ - **batch_mass_balance**: Run many compositions (e.g. seasonal or scenario variants) through the same removal efficiencies at once.
 
 **Mandatory Tool Usage**: For all data related to {place}'s MSW you MUST use the provided tools to fetch the most recent and accurate information. Do not rely solely on internal knowledge.
  - Use provided tools to access detailed information on waste composition, the percentage of fine metal present in waste composition in {place}, and the removal process, ensuring accuracy and relevance to the local context.
@@ -255,15 +463,9 @@ Note:
  - You'll only remove components only if they are specified by the process and exist in the waste composition.
  - Make sure the new waste composition is accurate and normalized to 100%.
 """
-shredding_purification_technician_agent = create_react_agent(
-    model=llm,
-    tools=[search_engine_duckduckgo, exa_search, search_engine_openai],
-    name="shredding_purification_technician",
-    prompt=shredding_purification_technician_prompt
-)
 
     # R4 Process Engineer Agent
-R4_process_engineer_prompt = f"""
+R4_process_engineer_prompt = """
 Role: You are an higly experienced R4 Process Engineer with 10 years of experience handling R4 Machines.\n
 The R4 Machine is a specialized piece of equipment used in the recycling industry, particularly for processing waste materials.\n
 It converts RDF (Refuse-Derived Fuel) into a solid fuel product that can be used in various applications, including making solid engineered fuel using Refuse-Derived Fuel (RDF).
@@ -286,6 +488,8 @@ Instruction: The sub processes in the R4 Machines are as follows:
  All process done in the R4 machine should be mentioned in details and how each factor was considered in the process before the final output is produced.\n
 
 Tools: You have access to the following tools:
+ - **local_kb_search**: Searches our local reference library of stable data (calorific values, chlorine content, recovery rates). Always call it first and use the web search tools only for what it does not cover.
+ - **meta_search**: Searches OpenAI's web search, DuckDuckGo and Exa at once and returns merged, de-duplicated results. Prefer it over calling the engines one by one.
  - **search_engine_openai**: For searching and retrieving information from OpenAI's web search tool.
  - **search_engine_duckduckgo**: For searching and retrieving information from DuckDuckGo's search engine.
  - **exa_search**: For searching and retrieving information from Exa's search engine.
@@ -308,12 +512,6 @@ Note: - The output doughy and sticky, make sure you do the prediction for the fu
 - Do not assume any process. The process is already defined in the prompt.
 - Provide links to the sources of information used in the process.
 """
-R4_process_engineer_agent = create_react_agent(
-    model=llm_o3,
-    tools=[search_engine_openai],
-    name="R4_process_engineer",
-    prompt=R4_process_engineer_prompt
-)
 
     # Water Bath Process Engineer Agent
 water_bath_process_engineer_prompt = """
@@ -338,6 +536,8 @@ Instruction:
     Ensure all analyses are supported by detailed insights from provided tools, maintaining precision and adherence to the water bath process specific to RDF production.
 
 Output: Provide a comprehensive explanation of: Tools: You have access to the following tools:
+ - **local_kb_search**: Searches our local reference library of stable data (calorific values, chlorine content, recovery rates). Always call it first and use the web search tools only for what it does not cover.
+ - **meta_search**: Searches OpenAI's web search, DuckDuckGo and Exa at once and returns merged, de-duplicated results. Prefer it over calling the engines one by one.
  - **search_engine_openai**: For searching and retrieving information from OpenAI's web search tool.
  - **search_engine_duckduckgo**: For searching and retrieving information from DuckDuckGo's search engine.
  - **exa_search**: For searching and retrieving information from Exa's search engine.
@@ -351,12 +551,6 @@ Output: Provide a comprehensive explanation of: Tools: You have access to the fo
 Note: - From the doughy product extruded into 2"x2" chunks, it is important to understand how the water bath process affects the final product.
  - Make sure the output is in a quantified format, like a table or dictionary.
 """
-water_bath_process_engineer_agent = create_react_agent(
-    model=llm_o3,
-    tools=[search_engine_openai, search_engine_duckduckgo, exa_search],
-    name="water_bath_process_engineer",
-    prompt=water_bath_process_engineer_prompt
-)
 
     # Process Engineer Workflow
 process_engineer_prompt = """
@@ -388,15 +582,696 @@ Note: - Ensure that the processes are executed accurately, with clear coordinati
 - Never do any task that is not assigned to you. You are ibky assigned to oversee the process and ensure that the agents execute their tasks correctly.\n
 
 """
-logger.info("Creating process engineer workflow")
-process_engineer_workflow = create_supervisor(
-    [sorting_engineer_agent, sorting_supervisor_agent, chlorine_reduction_specialist_agent, shredding_purification_technician_agent, R4_process_engineer_agent, water_bath_process_engineer_agent],
-    model=llm_o3,
-    output_mode="last_message",
-    prompt=process_engineer_prompt,
-    add_handoff_back_messages=True,
+# Stands in for {place} when a run names none, so the agents read it from the request
+PLACE_PLACEHOLDER = "the location given in the waste composition request"
+# Prompt placeholders, overridable per run through config["configurable"]
+PROMPT_PARAMETERS = {
+    "place": os.environ.get("DEFAULT_PLACE", PLACE_PLACEHOLDER),
+    "r4_negative_pressure": os.environ.get("R4_NEGATIVE_PRESSURE", "100"),
+    "r4_temperature": os.environ.get("R4_TEMPERATURE", "230"),
+    "r4_retention_time": os.environ.get("R4_RETENTION_TIME", "600"),
+}
+
+def templated_prompt(template: str):
+    """
+    Agent prompt that fills the template's placeholders from the run's config at call time.
+    Args:
+        template (str): Prompt text with {place} / {r4_*} placeholders.
+    Returns:
+        Callable: A create_react_agent prompt that prepends the rendered system message.
+    """
+    def prompt(state: MessagesState, config: RunnableConfig) -> List[BaseMessage]:
+        return [SystemMessage(content=template.format(**prompt_parameters(config)))] + state["messages"]
+    return prompt
+
+def prompt_parameters(config: RunnableConfig) -> Dict[str, object]:
+    configurable = config.get("configurable") or {}
+    return {name: configurable.get(name) or default for name, default in PROMPT_PARAMETERS.items()}
+
+LOCAL_KB_PROMPT_LINE = " - **local_kb_search**: Searches our local reference library of stable data (calorific values, chlorine content, recovery rates). Always call it first and use the web search tools only for what it does not cover.\n"
+# Research-first runs have no web search tools; the evidence they get up front stands in for them
+OFFLINE_KB_PROMPT_LINE = " - **local_kb_search**: Searches our local reference library of stable data (calorific values, chlorine content, recovery rates). Use it for anything the evidence you were given does not cover.\n"
+SEARCH_TOOL_PROMPT_LINES = {
+    meta_search.name: " - **meta_search**: Searches OpenAI's web search, DuckDuckGo and Exa at once and returns merged, de-duplicated results. Prefer it over calling the engines one by one.\n",
+    search_engine_openai.name: " - **search_engine_openai**: For searching and retrieving information from OpenAI's web search tool.\n",
+    search_engine_duckduckgo.name: " - **search_engine_duckduckgo**: For searching and retrieving information from DuckDuckGo's search engine.\n",
+    exa_search.name: " - **exa_search**: For searching and retrieving information from Exa's search engine.\n",
+}
+
+def stage_search_tools(name: str, web_search: bool) -> List[BaseTool]:
+    """
+    The search tools a stage's agent is given.
+    Args:
+        name (str): The stage (agent) name.
+        web_search (bool): Whether the run offers web search; if not, only the local knowledge base (if any).
+    Returns:
+        List[BaseTool]: The agent's search tools.
+    """
+    if not web_search:
+        return kb_tools
+    if name == "R4_process_engineer":
+        return kb_tools + [meta_search, search_engine_openai]
+    return research_tools
+
+def _offered_tools(template: str, tools: List[BaseTool]) -> str:
+    # Only describe the search tools the agent actually has, so it is never told to call a missing one
+    offered = {tool.name for tool in tools}
+    for name, line in SEARCH_TOOL_PROMPT_LINES.items():
+        if name not in offered:
+            template = template.replace(line, "")
+    if local_kb_search.name not in offered:
+        return template.replace(LOCAL_KB_PROMPT_LINE, "")
+    if not offered & set(SEARCH_TOOL_PROMPT_LINES):
+        return template.replace(LOCAL_KB_PROMPT_LINE, OFFLINE_KB_PROMPT_LINE)
+    return template
+
+AGENT_TEMPLATES = {
+    "sorting_supervisor": sorting_supervisor_prompt,
+    "sorting_engineer": sorting_engineer_prompt,
+    "chlorine_reduction_specialist": chlorine_reduction_specialist_prompt,
+    "shredding_purification_technician": shredding_purification_technician_prompt,
+    "R4_process_engineer": R4_process_engineer_prompt,
+    "water_bath_process_engineer": water_bath_process_engineer_prompt,
+}
+
+def agent_prompt(name: str, web_search: bool = True) -> str:
+    """
+    A stage agent's prompt template, describing only the search tools it is given.
+    Args:
+        name (str): The stage (agent) name.
+        web_search (bool): Whether the run offers web search.
+    Returns:
+        str: Prompt text with {place} / {r4_*} placeholders.
+    """
+    return _offered_tools(AGENT_TEMPLATES[name], stage_search_tools(name, web_search))
+
+def build_agents(preset: str, structured: bool = False, web_search: bool = True) -> Dict[str, object]:
+    """
+    Build the six specialist agents with the models of a profile preset.
+    Args:
+        preset (str): Name of a preset in model_profiles.json.
+        structured (bool): Also have each agent emit a StageOutput as its structured_response.
+        web_search (bool): Give the agents the web search tools; without them only the local
+            knowledge base is searchable, if it has content (research is then supplied up front).
+    Returns:
+        Dict[str, object]: Agent name to compiled ReAct agent.
+    """
+    profiles = get_preset(preset)
+    response_format = (STAGE_OUTPUT_PROMPT, StageOutput) if structured else None
+    agents = {}
+    agents["sorting_supervisor"] = create_react_agent(
+        model=get_llm(profiles["sorting_supervisor"]),
+        tools=stage_search_tools("sorting_supervisor", web_search) + mass_balance_tools,
+        name="sorting_supervisor",
+        prompt=templated_prompt(agent_prompt("sorting_supervisor", web_search)),
+        response_format=response_format,
+    )
+    agents["sorting_engineer"] = create_react_agent(
+        model=get_llm(profiles["sorting_engineer"]),
+        tools=stage_search_tools("sorting_engineer", web_search) + mass_balance_tools,
+        name="sorting_engineer",
+        prompt=templated_prompt(agent_prompt("sorting_engineer", web_search)),
+        response_format=response_format,
+    )
+    agents["chlorine_reduction_specialist"] = create_react_agent(
+        model=get_llm(profiles["chlorine_reduction_specialist"]),
+        tools=stage_search_tools("chlorine_reduction_specialist", web_search) + mass_balance_tools,
+        name="chlorine_reduction_specialist",
+        prompt=templated_prompt(agent_prompt("chlorine_reduction_specialist", web_search)),
+        response_format=response_format,
+    )
+    agents["shredding_purification_technician"] = create_react_agent(
+        model=get_llm(profiles["shredding_purification_technician"]),
+        tools=stage_search_tools("shredding_purification_technician", web_search) + mass_balance_tools,
+        name="shredding_purification_technician",
+        prompt=templated_prompt(agent_prompt("shredding_purification_technician", web_search)),
+        response_format=response_format,
+    )
+    agents["R4_process_engineer"] = create_react_agent(
+        model=get_llm(profiles["R4_process_engineer"]),
+        tools=stage_search_tools("R4_process_engineer", web_search),
+        name="R4_process_engineer",
+        prompt=templated_prompt(agent_prompt("R4_process_engineer", web_search)),
+        response_format=response_format,
+    )
+    agents["water_bath_process_engineer"] = create_react_agent(
+        model=get_llm(profiles["water_bath_process_engineer"]),
+        tools=stage_search_tools("water_bath_process_engineer", web_search),
+        name="water_bath_process_engineer",
+        prompt=templated_prompt(agent_prompt("water_bath_process_engineer", web_search)),
+        response_format=response_format,
+    )
+    return agents
+
+def build_workflow(preset: str):
+    """
+    Build the supervisor workflow for a profile preset.
+    Args:
+        preset (str): Name of a preset in model_profiles.json.
+    Returns:
+        StateGraph: The uncompiled supervisor workflow.
+    """
+    agents = build_agents(preset)
+    logger.info(f"Creating process engineer workflow with the {preset} model preset")
+    return create_supervisor(
+        [agents[name] for name in ["sorting_engineer", "sorting_supervisor", "chlorine_reduction_specialist", "shredding_purification_technician", "R4_process_engineer", "water_bath_process_engineer"]],
+        model=get_llm(get_preset(preset)["supervisor"]),
+        output_mode="last_message",
+        prompt=process_engineer_prompt,
+        add_handoff_back_messages=True,
+    )
+
+@lru_cache(maxsize=None)
+def get_workflow(preset: str = DEFAULT_PRESET, checkpointer: Optional[BaseCheckpointSaver] = None):
+    """
+    Compiled workflow for a profile preset (and optional checkpointer), built once per process.
+    """
+    logger.info(f"Compiling process engineer workflow for the {preset} model preset")
+    return build_workflow(preset).compile(checkpointer=checkpointer)
+
+# Compile workflow
+app_workflow = get_workflow(DEFAULT_PRESET)
+
+
+# Sequential pipeline: the stage order is fixed, so no LLM routing is needed
+STAGES = (
+    "sorting_supervisor",
+    "sorting_engineer",
+    "chlorine_reduction_specialist",
+    "shredding_purification_technician",
+    "R4_process_engineer",
+    "water_bath_process_engineer",
 )
 
-    # Compile workflow
-logger.info("Compiling process engineer workflow")
-app_workflow = process_engineer_workflow.compile()
+def resolve_stages(stages: Optional[Sequence[str]] = None) -> Tuple[str, ...]:
+    """
+    Validate a stage list and put it in process order.
+    Args:
+        stages (Sequence[str]): Stage (agent) names to run; all stages when empty.
+    Returns:
+        Tuple[str, ...]: The enabled stages in process order.
+    """
+    if not stages:
+        return STAGES
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages {sorted(unknown)}; expected any of {list(STAGES)}")
+    return tuple(name for name in STAGES if name in stages)
+
+class PipelineState(MessagesState):
+    composition: Optional[CompositionState]
+    evidence: Optional[Dict[str, str]]
+
+def _stage_input(name: str, state: PipelineState) -> Dict[str, List[BaseMessage]]:
+    # A stage sees the original request plus the typed state, not the earlier stages' reports
+    messages = list(state["messages"][:1])
+    if state.get("composition"):
+        messages.append(HumanMessage(content=(
+            "Composition state after the previous stages. It is authoritative: start from this "
+            "composition, not the one in the request.\n"
+            f"{state['composition'].model_dump_json(exclude_none=True, exclude=BOOKKEEPING_FIELDS)}"
+        )))
+    if (state.get("evidence") or {}).get(name):
+        messages.append(HumanMessage(content=(
+            "Research for this stage was gathered up front and web search is not available in this run. "
+            f"Base your answer on this evidence{' (and local_kb_search)' if kb_tools else ''} and cite its sources.\n\n"
+            f"{state['evidence'][name]}"
+        )))
+    return {"messages": messages}
+
+def _stage_update(name: str, state: PipelineState, message: BaseMessage, output: StageOutput, replayed: bool) -> dict:
+    composition = state.get("composition") or CompositionState(composition={})
+    return {"messages": [message], "composition": composition.apply(name, output, replayed)}
+
+def _stage_key(name: str, profile: ModelProfile, web_search: bool, state: PipelineState, config: RunnableConfig) -> str:
+    # Content address of a stage run: its input messages, the parameters its prompt actually
+    # uses, its model profile, its tools and the prompt text itself (so editing a prompt invalidates it)
+    template = agent_prompt(name, web_search)
+    used = {field for _, field, _, _ in string.Formatter().parse(template) if field}
+    return memo_key(name, {
+        "inputs": [m.content for m in _stage_input(name, state)["messages"]],
+        "parameters": {k: v for k, v in prompt_parameters(config).items() if k in used},
+        "profile": profile.model_dump(),
+        "web_search": web_search,
+        "prompt": template + STAGE_OUTPUT_PROMPT,
+    })
+
+def _memo_get(name: str, key: str) -> Optional[Tuple[BaseMessage, StageOutput]]:
+    if stage_memo is None or llm_cache_bypass.get():
+        return None
+    cached = stage_memo.get(name, key)
+    if cached is None:
+        return None
+    return messages_from_dict([cached["message"]])[0], StageOutput.model_validate(cached["output"])
+
+def _memo_set(name: str, key: str, message: BaseMessage, output: StageOutput) -> None:
+    if stage_memo is not None:
+        stage_memo.set(name, key, {"message": message_to_dict(message), "output": output.model_dump(mode="json")})
+
+def _stage_node(name: str, agent, profile: ModelProfile, web_search: bool):
+    def run(state: PipelineState, config: RunnableConfig):
+        key = _stage_key(name, profile, web_search, state, config)
+        cached = _memo_get(name, key)
+        replayed = cached is not None
+        if cached is None:
+            result = agent.invoke(_stage_input(name, state), config)
+            cached = result["messages"][-1], result["structured_response"]
+            _memo_set(name, key, *cached)
+        return _stage_update(name, state, *cached, replayed)
+
+    async def arun(state: PipelineState, config: RunnableConfig):
+        key = _stage_key(name, profile, web_search, state, config)
+        cached = await asyncio.to_thread(_memo_get, name, key)
+        replayed = cached is not None
+        if cached is None:
+            result = await agent.ainvoke(_stage_input(name, state), config)
+            cached = result["messages"][-1], result["structured_response"]
+            await asyncio.to_thread(_memo_set, name, key, *cached)
+        return _stage_update(name, state, *cached, replayed)
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+def _research_node(stages: Tuple[str, ...]):
+    # Every stage's research is independent of the composition, so it all runs first, concurrently
+    async def arun(state: PipelineState, config: RunnableConfig):
+        # Checked here too: callers of app_research_pipeline bypass the API's check
+        place = str(prompt_parameters(config)["place"]).strip()
+        if not place or place == PLACE_PLACEHOLDER:
+            raise ValueError("research_first mode needs a place to research; set configurable.place or DEFAULT_PLACE")
+        evidence = await gather_evidence(place, list(stages))
+        return {"evidence": {stage: render_evidence(found) for stage, found in evidence.items()}}
+
+    def run(state: PipelineState, config: RunnableConfig):
+        return asyncio.run(arun(state, config))
+
+    return RunnableLambda(run, afunc=arun, name="research")
+
+def build_pipeline(preset: str, stages: Tuple[str, ...] = STAGES, research_first: bool = False) -> StateGraph:
+    """
+    Build a deterministic pipeline that runs the enabled stages in order with static edges.
+    Args:
+        preset (str): Name of a preset in model_profiles.json.
+        stages (Tuple[str, ...]): Enabled stages, in process order.
+        research_first (bool): Run all stages' research queries concurrently before the first stage
+            and hand each stage its evidence, instead of letting the agents search mid-stage.
+    Returns:
+        StateGraph: The uncompiled pipeline.
+    """
+    web_search = not research_first
+    agents = build_agents(preset, structured=True, web_search=web_search)
+    profiles = get_preset(preset)
+    logger.info(f"Creating process engineer pipeline with the {preset} model preset: {' -> '.join(stages)}")
+    builder = StateGraph(PipelineState)
+    previous = START
+    if research_first:
+        builder.add_node("research", _research_node(stages))
+        builder.add_edge(START, "research")
+        previous = "research"
+    for name in stages:
+        builder.add_node(name, _stage_node(name, agents[name], profiles[name], web_search))
+        builder.add_edge(previous, name)
+        previous = name
+    builder.add_edge(previous, END)
+    return builder
+
+@lru_cache(maxsize=None)
+def get_pipeline(
+    preset: str = DEFAULT_PRESET,
+    stages: Tuple[str, ...] = STAGES,
+    checkpointer: Optional[BaseCheckpointSaver] = None,
+    research_first: bool = False,
+):
+    """
+    Compiled pipeline for a preset, stage list, optional checkpointer and research mode, built once per process.
+    """
+    return build_pipeline(preset, resolve_stages(stages), research_first).compile(checkpointer=checkpointer)
+
+app_pipeline = get_pipeline(DEFAULT_PRESET, STAGES)
+app_research_pipeline = get_pipeline(DEFAULT_PRESET, STAGES, research_first=True)
+
+
+# R4 parameter sweeps: upstream stages don't depend on the R4 settings, so they run once
+R4_STAGES = ("R4_process_engineer", "water_bath_process_engineer")
+R4_PARAMETERS = ("r4_negative_pressure", "r4_temperature", "r4_retention_time")
+SWEEP_CONCURRENCY = int(os.environ.get("SWEEP_CONCURRENCY", "4"))
+
+def r4_parameters(values: Dict[str, object]) -> Dict[str, float]:
+    return {name: float(values.get(name) or PROMPT_PARAMETERS[name]) for name in R4_PARAMETERS}
+
+def log_surrogate_sample(composition: Optional[CompositionState], parameters: Dict[str, object]) -> None:
+    """
+    Add a finished run to the fuel property surrogate's training data, if its R4 stage started
+    from a known composition, the surrogate's target stage reported the fuel properties, and
+    neither R4 stage was replayed from the stage memo (a replay is not a new observation).
+    Args:
+        composition (CompositionState): The run's final state.
+        parameters (Dict[str, object]): The run's prompt parameters (R4 settings default as configured).
+    """
+    feed = composition.inputs.get(R4_STAGES[0]) if composition else None
+    if not feed or composition.fuel_properties is None or composition.fuel_properties_stage != TARGET_STAGE:
+        return
+    if any(stage in composition.replayed for stage in R4_STAGES):
+        metrics.incr("surrogate.replays_skipped")
+        return
+    try:
+        surrogate.log(feed, r4_parameters(parameters), composition.fuel_properties, composition.fuel_properties_stage)
+    except Exception as e:
+        logger.error(f"Logging surrogate sample failed: {str(e)}")
+
+def sweep_grid(values: Dict[str, Sequence[float]]) -> List[Dict[str, float]]:
+    """
+    Expand per-parameter value lists into grid points.
+    Args:
+        values (Dict[str, Sequence[float]]): R4 parameter name to the values to try; missing or empty
+            parameters keep their configured default.
+    Returns:
+        List[Dict[str, float]]: One parameter dict per grid point.
+    """
+    unknown = set(values) - set(R4_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown R4 parameters {sorted(unknown)}; expected any of {list(R4_PARAMETERS)}")
+    names = [name for name in R4_PARAMETERS if values.get(name)]
+    return [dict(zip(names, point)) for point in itertools.product(*(values[name] for name in names))]
+
+class SweepPoint(BaseModel):
+    parameters: Dict[str, float]
+    output: Optional[str] = None
+    composition: Optional[CompositionState] = None
+    error: Optional[str] = None
+
+def r4_sweep(
+    message: str,
+    grid: List[Dict[str, float]],
+    preset: str = DEFAULT_PRESET,
+    stages: Optional[Sequence[str]] = None,
+    parameters: Optional[Dict[str, object]] = None,
+    concurrency: int = SWEEP_CONCURRENCY,
+) -> AsyncIterator[SweepPoint]:
+    """
+    Run the upstream stages once, then fan the R4 and water bath stages out over a parameter grid.
+    Arguments are validated immediately; the stages run as the returned iterator is consumed.
+    Args:
+        message (str): The waste composition request.
+        grid (List[Dict[str, float]]): R4 parameters for each grid point.
+        preset (str): Name of a preset in model_profiles.json.
+        stages (Sequence[str]): Enabled stages; all stages when empty.
+        parameters (Dict[str, object]): Prompt parameters shared by every point (e.g. place).
+        concurrency (int): Maximum number of grid points running at once.
+    Returns:
+        AsyncIterator[SweepPoint]: One result per grid point, in completion order.
+    """
+    get_preset(preset)
+    enabled = resolve_stages(stages)
+    upstream = tuple(name for name in enabled if name not in R4_STAGES)
+    downstream = tuple(name for name in enabled if name in R4_STAGES)
+    if not downstream:
+        raise ValueError("A sweep needs the R4 or water bath stage enabled")
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    return _run_sweep(message, grid, preset, upstream, downstream, parameters or {}, concurrency)
+
+async def _run_sweep(
+    message: str,
+    grid: List[Dict[str, float]],
+    preset: str,
+    upstream: Tuple[str, ...],
+    downstream: Tuple[str, ...],
+    parameters: Dict[str, object],
+    concurrency: int,
+) -> AsyncIterator[SweepPoint]:
+    state = {"messages": [{"role": "user", "content": message}]}
+    if upstream:
+        logger.info(f"Running upstream stages once for a {len(grid)}-point R4 sweep")
+        state = await get_pipeline(preset, upstream).ainvoke(state, {"configurable": parameters})
+    pipeline = get_pipeline(preset, downstream)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run_point(point: Dict[str, float]) -> SweepPoint:
+        async with slots:
+            try:
+                result = await pipeline.ainvoke(state, {"configurable": {**parameters, **point}})
+            except Exception as e:
+                logger.error(f"R4 sweep point {point} failed: {str(e)}")
+                return SweepPoint(parameters=point, error=str(e))
+            await asyncio.to_thread(log_surrogate_sample, result.get("composition"), {**parameters, **point})
+            return SweepPoint(parameters=point, output=result["messages"][-1].content, composition=result.get("composition"))
+
+    tasks = [asyncio.create_task(run_point(point)) for point in grid]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The consumer may stop early (e.g. the client disconnected)
+        for task in tasks:
+            task.cancel()
+
+
+# API
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The async checkpointer is bound to the serving event loop, so it is opened here
+    app.state.checkpointer = open_checkpointer()
+    try:
+        yield
+    finally:
+        await app.state.checkpointer.conn.close()
+        await registry.aclose()
+
+app = FastAPI(title="RDF Process Engineering Agents", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+class WorkflowRequest(BaseModel):
+    message: str
+    preset: Optional[str] = None
+    mode: Literal["supervisor", "pipeline", "research_first"] = "supervisor"
+    stages: Optional[List[str]] = None
+    place: Optional[str] = None
+    r4_negative_pressure: Optional[float] = None
+    r4_temperature: Optional[float] = None
+    r4_retention_time: Optional[float] = None
+    thread_id: Optional[str] = None
+
+class WorkflowResponse(BaseModel):
+    output: str
+    thread_id: str
+    composition: Optional[CompositionState] = None
+
+def _checkpointed_workflow(request: WorkflowRequest, checkpointer: BaseCheckpointSaver):
+    preset = request.preset or DEFAULT_PRESET
+    try:
+        if request.mode == "research_first" and not (request.place or os.environ.get("DEFAULT_PLACE")):
+            raise ValueError("research_first mode needs a place to research")
+        if request.mode in ("pipeline", "research_first"):
+            return get_pipeline(preset, resolve_stages(request.stages), checkpointer, request.mode == "research_first")
+        return get_workflow(preset, checkpointer)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def _speculation(request: WorkflowRequest) -> Optional[SpeculativePrefetch]:
+    # Research-first runs already have all their evidence; without a place there is nothing to prefetch
+    place = request.place or os.environ.get("DEFAULT_PLACE")
+    if not SPECULATION_ENABLED or request.mode == "research_first" or not place:
+        return None
+    stages = resolve_stages(request.stages) if request.mode == "pipeline" else STAGES
+    return SpeculativePrefetch(place, stages, SEARCH_TOOL_PROVIDERS)
+
+def _run_config(request: WorkflowRequest, thread_id: str, speculation: Optional[SpeculativePrefetch] = None) -> RunnableConfig:
+    parameters = {name: getattr(request, name) for name in PROMPT_PARAMETERS if getattr(request, name) is not None}
+    return {
+        "configurable": {"thread_id": thread_id, **parameters},
+        # Stored with every checkpoint so a resume rebuilds the same workflow
+        "metadata": {"workflow_request": request.model_dump_json()},
+        "callbacks": [speculation] if speculation else [],
+    }
+
+async def _invoke(
+    workflow, input, config: RunnableConfig, x_llm_cache: Optional[str], speculation: Optional[SpeculativePrefetch] = None
+) -> WorkflowResponse:
+    token = llm_cache_bypass.set((x_llm_cache or "").lower() == "bypass")
+    try:
+        result = await workflow.ainvoke(input, config)
+    except Exception as e:
+        thread_id = config["configurable"]["thread_id"]
+        logger.error(f"Workflow run {thread_id} failed: {str(e)}")
+        # The thread_id may have been generated for this run; without it the checkpoints can't be resumed
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"error": str(e), "thread_id": thread_id},
+            headers={"X-Thread-Id": thread_id},
+        )
+    finally:
+        llm_cache_bypass.reset(token)
+        if speculation:
+            speculation.close()
+    return WorkflowResponse(
+        output=result["messages"][-1].content,
+        thread_id=config["configurable"]["thread_id"],
+        composition=result.get("composition"),
+    )
+
+@app.post("/workflow", response_model=WorkflowResponse)
+async def run_workflow(request: WorkflowRequest, x_llm_cache: Optional[str] = Header(default=None)):
+    """
+    Run the process engineer workflow on a waste composition message.
+    Send the header `X-LLM-Cache: bypass` to skip cached LLM responses and memoized stages for this request.
+    Set `preset` to run with the fast, balanced or thorough model profiles.
+    Set `mode` to "pipeline" to run `stages` (default: all) in fixed order without the LLM supervisor,
+    or to "research_first" to also run all their research concurrently up front (requires `place`).
+    Every super-step is checkpointed under the returned `thread_id`; if the run fails, the error's
+    `thread_id` (also in the `X-Thread-Id` header) continues it with POST /workflow/{thread_id}/resume. In supervisor mode, passing an existing `thread_id`
+    continues that conversation; pipeline runs always start from their own message, so they need a new one.
+    """
+    if request.thread_id:
+        checkpoint = await app.state.checkpointer.aget_tuple({"configurable": {"thread_id": request.thread_id}})
+        previous = checkpoint.metadata.get("workflow_request") if checkpoint else None
+        previous_mode = WorkflowRequest.model_validate_json(previous).mode if previous else None
+        # Pipeline stages read the thread's first message and composition, so a new message would be ignored
+        if previous_mode is not None and (request.mode != "supervisor" or previous_mode != "supervisor"):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"thread_id {request.thread_id} already has a {previous_mode} run; start this {request.mode} "
+                       f"run on a new thread_id, or POST /workflow/{request.thread_id}/resume to continue that one",
+            )
+    workflow = _checkpointed_workflow(request, app.state.checkpointer)
+    speculation = _speculation(request)
+    config = _run_config(request, request.thread_id or str(uuid.uuid4()), speculation)
+    input = {"messages": [{"role": "user", "content": request.message}]}
+    response = await _invoke(workflow, input, config, x_llm_cache, speculation)
+    await asyncio.to_thread(log_surrogate_sample, response.composition, config["configurable"])
+    return response
+
+@app.post("/workflow/{thread_id}/resume", response_model=WorkflowResponse)
+async def resume_workflow(thread_id: str, x_llm_cache: Optional[str] = Header(default=None)):
+    """
+    Continue a failed or interrupted run from its last completed super-step.
+    A run that already finished returns its final output without doing any work.
+    """
+    checkpoint = await app.state.checkpointer.aget_tuple({"configurable": {"thread_id": thread_id}})
+    if checkpoint is None or "workflow_request" not in checkpoint.metadata:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No checkpointed run with thread_id {thread_id}")
+    request = WorkflowRequest.model_validate_json(checkpoint.metadata["workflow_request"])
+    workflow = _checkpointed_workflow(request, app.state.checkpointer)
+    speculation = _speculation(request)
+    config = _run_config(request, thread_id, speculation)
+    snapshot = await workflow.aget_state(config)
+    logger.info(f"Resuming workflow run {thread_id} at {list(snapshot.next) or 'end'}")
+    response = await _invoke(workflow, None, config, x_llm_cache, speculation)
+    if snapshot.next:
+        await asyncio.to_thread(log_surrogate_sample, response.composition, config["configurable"])
+    return response
+
+class PredictRequest(BaseModel):
+    composition: Dict[str, float]
+    place: Optional[str] = None
+    preset: Optional[str] = None
+    r4_negative_pressure: Optional[float] = None
+    r4_temperature: Optional[float] = None
+    r4_retention_time: Optional[float] = None
+    fallback: bool = True
+
+class PredictResponse(BaseModel):
+    source: Literal["surrogate", "pipeline"]
+    properties: Optional[FuelComposition] = None
+    surrogate: SurrogatePrediction
+    thread_id: Optional[str] = None
+
+@app.post("/predict", response_model=PredictResponse)
+async def predict(request: PredictRequest, x_llm_cache: Optional[str] = Header(default=None)):
+    """
+    Predict the fuel properties of an RDF composition after the R4 and water bath stages.
+    Answers instantly from the surrogate model when it is confident; otherwise (unless
+    `fallback` is false) runs the R4 and water bath agents, whose result also becomes a training sample.
+    """
+    parameters = r4_parameters(request.model_dump())
+    # Reads the samples and may refit the model: keep it off the event loop
+    prediction = await asyncio.to_thread(predict_fuel_properties, request.composition, parameters)
+    if prediction.confident or not request.fallback:
+        return PredictResponse(
+            source="surrogate", properties=prediction.properties if prediction.confident else None, surrogate=prediction
+        )
+    logger.info(f"Surrogate not confident ({prediction.reason}); running the R4 stages")
+    workflow_request = WorkflowRequest(
+        message="RDF composition entering the R4 machine:\n"
+        + "\n".join(f"- {name}: {value}%" for name, value in request.composition.items()),
+        preset=request.preset,
+        mode="pipeline",
+        stages=list(R4_STAGES),
+        place=request.place,
+        **parameters,
+    )
+    workflow = _checkpointed_workflow(workflow_request, app.state.checkpointer)
+    speculation = _speculation(workflow_request)
+    config = _run_config(workflow_request, str(uuid.uuid4()), speculation)
+    input = {
+        "messages": [{"role": "user", "content": workflow_request.message}],
+        "composition": CompositionState(composition=request.composition),
+    }
+    response = await _invoke(workflow, input, config, x_llm_cache, speculation)
+    await asyncio.to_thread(log_surrogate_sample, response.composition, config["configurable"])
+    return PredictResponse(
+        source="pipeline",
+        properties=response.composition.fuel_properties if response.composition else None,
+        surrogate=prediction,
+        thread_id=response.thread_id,
+    )
+
+class SweepRequest(BaseModel):
+    message: str
+    preset: Optional[str] = None
+    stages: Optional[List[str]] = None
+    place: Optional[str] = None
+    r4_negative_pressure: List[float] = []
+    r4_temperature: List[float] = []
+    r4_retention_time: List[float] = []
+    concurrency: int = SWEEP_CONCURRENCY
+
+@app.post("/sweep")
+async def run_sweep(request: SweepRequest, x_llm_cache: Optional[str] = Header(default=None)):
+    """
+    Sweep the R4 parameters over the grid of the given values, streaming one JSON line per point
+    as it completes. The upstream stages run once; only the R4 and water bath stages run per point.
+    """
+    try:
+        points = r4_sweep(
+            request.message,
+            sweep_grid({name: getattr(request, name) for name in R4_PARAMETERS}),
+            preset=request.preset or DEFAULT_PRESET,
+            stages=request.stages,
+            parameters={"place": request.place} if request.place else {},
+            concurrency=request.concurrency,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    async def stream():
+        token = llm_cache_bypass.set((x_llm_cache or "").lower() == "bypass")
+        try:
+            async for point in points:
+                yield point.model_dump_json() + "\n"
+        except Exception as e:
+            logger.error(f"R4 sweep failed: {str(e)}")
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            llm_cache_bypass.reset(token)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/metrics")
+def get_metrics():
+    return {
+        "counters": metrics.snapshot(),
+        "search_cache": search_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "stage_memo": stage_memo.stats() if stage_memo else None,
+        "checkpoints": checkpoint_stats(),
+        "speculation": speculation_stats(),
+        "surrogate": surrogate.stats(),
+        "providers": health.stats(),
+        "hedging": hedge_stats(),
+        "rate_limits": limiters.stats(),
+    }
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8000")))
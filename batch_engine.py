@@ -0,0 +1,109 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict
+
+from mass_balance import resolve_category
+
+# Process order of the separation stages in front of the R4 machine
+STAGE_ORDER = (
+    "bulky_removal",
+    "magnetic_separation",
+    "eddy_current_separation",
+    "glass_separation",
+    "chlorine_reduction",
+    "fine_metal_removal",
+)
+
+
+class BatchResult(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    components: List[str]
+    composition: np.ndarray
+    mass_yield: np.ndarray
+
+    def to_dicts(self) -> List[Dict[str, float]]:
+        return [dict(zip(self.components, row.tolist())) for row in self.composition]
+
+
+class BatchEngine:
+    """
+    Runs N compositions over K components through the separation stages at once.
+    Every stage removes a fixed share of each component, so a stage is a per-column
+    retention factor and the whole chain collapses into one (K,) vector: the output is
+    a single multiply, a row sum for the mass yield and a row normalization to 100%.
+    Matches mass_balance.chain, which renormalizes after each stage; scaling commutes
+    with the per-column factors, so normalizing once at the end gives the same result.
+    """
+
+    def __init__(self, components: Sequence[str], stages: Dict[str, Dict[str, float]]):
+        """
+        Args:
+            components (Sequence[str]): Column names of the composition arrays.
+            stages (Dict[str, Dict[str, float]]): Stage name to component name to % removed (0-100).
+                Stages named in STAGE_ORDER run in that order, any others after them in the given order.
+        """
+        self.components = list(components)
+        self._columns = {name: i for i, name in enumerate(self.components)}
+        self.stages = sorted(stages, key=lambda s: STAGE_ORDER.index(s) if s in STAGE_ORDER else len(STAGE_ORDER))
+        self.retention = np.ones((len(self.stages), len(self.components)))
+        for row, stage in enumerate(self.stages):
+            for category, pct in stages[stage].items():
+                if not 0 <= pct <= 100:
+                    raise ValueError(f"Removal efficiency for '{category}' in {stage} must be between 0 and 100, got {pct}")
+                self.retention[row, self._column(category)] = 1 - pct / 100
+        self.overall = self.retention.prod(axis=0)
+
+    def _column(self, category: str) -> int:
+        return self._columns[resolve_category(self._columns, category)]
+
+    def to_array(self, compositions: Sequence[Dict[str, float]]) -> np.ndarray:
+        """
+        Pack composition dicts into an N×K array in this engine's column order; missing components are 0.
+        """
+        array = np.zeros((len(compositions), len(self.components)))
+        for i, composition in enumerate(compositions):
+            for category, value in composition.items():
+                array[i, self._column(category)] = value
+        return array
+
+    def run(self, compositions: np.ndarray, through: Optional[str] = None) -> BatchResult:
+        """
+        Push a batch of compositions through the stages.
+        Args:
+            compositions (np.ndarray): N×K feed compositions (percentages or masses; each row is normalized).
+            through (str): Stop after this stage instead of running all of them.
+        Returns:
+            BatchResult: N×K output compositions in % and the N mass yields in % of the feed.
+        """
+        feed = np.asarray(compositions, dtype=np.float64)
+        if feed.ndim != 2 or feed.shape[1] != len(self.components):
+            raise ValueError(f"Expected an N×{len(self.components)} array, got shape {feed.shape}")
+        if (feed < 0).any():
+            raise ValueError("Composition values must not be negative")
+        retention = self.overall if through is None else self.retention[:self.stages.index(through) + 1].prod(axis=0)
+        totals = feed.sum(axis=1)
+        remaining = feed * retention
+        remaining_totals = remaining.sum(axis=1)
+        mass_yield = np.divide(remaining_totals * 100, totals, out=np.zeros_like(totals), where=totals > 0)
+        composition = np.divide(
+            remaining * 100, remaining_totals[:, None], out=np.zeros_like(remaining), where=remaining_totals[:, None] > 0
+        )
+        return BatchResult(components=self.components, composition=composition, mass_yield=mass_yield)
+
+
+def run_batch(
+    compositions: Sequence[Dict[str, float]], stages: Dict[str, Dict[str, float]]
+) -> BatchResult:
+    """
+    Convenience wrapper: build an engine over every component seen and run the batch.
+    Args:
+        compositions (Sequence[Dict[str, float]]): Feed compositions, component name to percentage.
+        stages (Dict[str, Dict[str, float]]): Stage name to component name to % removed (0-100).
+    Returns:
+        BatchResult: The output compositions and mass yields.
+    """
+    components = list(dict.fromkeys(name for composition in compositions for name in composition))
+    engine = BatchEngine(components, stages)
+    return engine.run(engine.to_array(compositions))
@@ -0,0 +1,107 @@
+import os
+import time
+import zlib
+import logging
+from typing import Any, Dict, Sequence, Tuple
+
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", ".cache/checkpoints.sqlite")
+# Smaller payloads (channel versions, short writes) are not worth compressing
+COMPRESS_MIN_BYTES = int(os.environ.get("CHECKPOINT_COMPRESS_MIN_BYTES", "512"))
+COMPRESSED_SUFFIX = "+zlib"
+# Our own state models that may appear in checkpoints
+ALLOWED_MSGPACK_MODULES = [
+    ("workflow_state", "CompositionState"),
+    ("workflow_state", "StageOutput"),
+    ("workflow_state", "ComponentShare"),
+    ("workflow_state", "FuelComposition"),
+    ("results", "Citation"),
+]
+
+
+class CompressedSerializer:
+    """
+    The default msgpack checkpoint serializer, zlib-compressed above COMPRESS_MIN_BYTES.
+    Checkpoints are dominated by message text, which compresses several times over.
+    Compression is marked in the type tag, so uncompressed checkpoints still load.
+    """
+
+    def __init__(self):
+        self.serde = JsonPlusSerializer(allowed_msgpack_modules=ALLOWED_MSGPACK_MODULES)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        metrics.incr("checkpoint.raw_bytes", len(data))
+        if len(data) >= COMPRESS_MIN_BYTES:
+            type_, data = type_ + COMPRESSED_SUFFIX, zlib.compress(data, 1)
+        metrics.incr("checkpoint.stored_bytes", len(data))
+        return type_, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.endswith(COMPRESSED_SUFFIX):
+            type_, payload = type_[:-len(COMPRESSED_SUFFIX)], zlib.decompress(payload)
+        return self.serde.loads_typed((type_, payload))
+
+
+class MeasuredSqliteSaver(AsyncSqliteSaver):
+    """
+    SQLite checkpointer that records how long each checkpoint and pending-write batch takes to persist.
+    """
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        start = time.perf_counter()
+        try:
+            return await super().aput(config, checkpoint, metadata, new_versions)
+        finally:
+            metrics.observe("checkpoint.put", time.perf_counter() - start)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        start = time.perf_counter()
+        try:
+            await super().aput_writes(config, writes, task_id, task_path)
+        finally:
+            metrics.observe("checkpoint.put_writes", time.perf_counter() - start)
+
+
+def open_checkpointer(path: str = CHECKPOINT_PATH) -> MeasuredSqliteSaver:
+    """
+    Open the durable checkpointer. Must be called from the event loop that will use it.
+    Args:
+        path (str): The SQLite database file.
+    Returns:
+        MeasuredSqliteSaver: The checkpointer; close it with `await saver.conn.close()`.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    logger.info(f"Opening workflow checkpoints at {path}")
+    return MeasuredSqliteSaver(aiosqlite.connect(path), serde=CompressedSerializer())
+
+
+def checkpoint_stats() -> Dict[str, float]:
+    stats = metrics.snapshot("checkpoint.")
+    if stats.get("checkpoint.raw_bytes"):
+        stats["checkpoint.compression_ratio"] = stats["checkpoint.stored_bytes"] / stats["checkpoint.raw_bytes"]
+    return stats
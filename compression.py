@@ -0,0 +1,103 @@
+import os
+import re
+import math
+from collections import Counter
+from typing import List
+
+# Roughly 4 characters per token for English text
+CHARS_PER_TOKEN = 4
+COMPRESSION_ENABLED = os.environ.get("SEARCH_COMPRESSION", "1") == "1"
+MAX_TOKENS = int(os.environ.get("SEARCH_COMPRESS_MAX_TOKENS", "800"))
+TOP_SENTENCES = int(os.environ.get("SEARCH_COMPRESS_TOP_SENTENCES", "3"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "is", "are", "was", "were", "be",
+    "what", "which", "how", "much", "many", "by", "from", "with", "at", "as", "do", "does", "that",
+    "this", "it", "its", "their", "there", "these", "those", "can", "about",
+}
+
+NUMBER = re.compile(r"\d+(?:[.,]\d+)?\s*(?:%|percent|kg|mj|wt|ppm|mm|°c|tonnes?|tons?)?", re.IGNORECASE)
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\[\"'])|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def tokenize(text: str) -> List[str]:
+    return [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in STOPWORDS]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_BOUNDARY.split(text) if s and s.strip()]
+
+
+def bm25_scores(query: str, documents: List[List[str]]) -> List[float]:
+    """
+    Score tokenized documents against a query with Okapi BM25.
+    Args:
+        query (str): The query text.
+        documents (List[List[str]]): Tokenized documents.
+    Returns:
+        List[float]: One score per document.
+    """
+    if not documents:
+        return []
+    avg_length = sum(len(d) for d in documents) / len(documents) or 1
+    document_frequency = Counter(term for d in documents for term in set(d))
+    n = len(documents)
+    terms = set(tokenize(query))
+    scores = []
+    for document in documents:
+        frequencies = Counter(document)
+        score = 0.0
+        for term in terms:
+            tf = frequencies.get(term)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(document) / avg_length))
+        scores.append(score)
+    return scores
+
+
+def compress(text: str, query: str, max_tokens: int = MAX_TOKENS) -> str:
+    """
+    Shrink a search answer to the sentences that matter for the query.
+    The best BM25 matches are kept first, then sentences carrying numbers or
+    percentages, then the remaining matches, until the token budget is spent.
+    Sentences keep their original order; dropped spans are marked with "…".
+    Args:
+        text (str): The answer text.
+        query (str): The query that produced it.
+        max_tokens (int): Token budget for the compressed text.
+    Returns:
+        str: The compressed text, or the original if it already fits.
+    """
+    if not COMPRESSION_ENABLED or estimate_tokens(text) <= max_tokens:
+        return text
+    sentences = split_sentences(text)
+    scores = bm25_scores(query, [tokenize(s) for s in sentences])
+    by_score = sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True)
+    top = [i for i in by_score[:TOP_SENTENCES] if scores[i] > 0]
+    numeric = [i for i in by_score if i not in top and NUMBER.search(sentences[i])]
+    rest = [i for i in by_score if i not in top and i not in numeric and scores[i] > 0]
+    kept, used = set(), 0
+    for i in top + numeric + rest:
+        cost = estimate_tokens(sentences[i]) + 1
+        if used + cost > max_tokens:
+            continue
+        kept.add(i)
+        used += cost
+    if not kept:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    parts, previous = [], -1
+    for i in sorted(kept):
+        if previous >= 0 and i != previous + 1:
+            parts.append("…")
+        parts.append(sentences[i])
+        previous = i
+    return " ".join(parts)
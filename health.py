@@ -0,0 +1,157 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ERROR_THRESHOLD = float(os.environ.get("CIRCUIT_ERROR_THRESHOLD", "0.5"))
+MIN_REQUESTS = int(os.environ.get("CIRCUIT_MIN_REQUESTS", "5"))
+WINDOW = int(os.environ.get("CIRCUIT_WINDOW", "20"))
+COOLDOWN = float(os.environ.get("CIRCUIT_COOLDOWN", "30"))
+EWMA_ALPHA = float(os.environ.get("CIRCUIT_EWMA_ALPHA", "0.2"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class ProviderHealth:
+    """
+    Rolling error rate and latency EWMA for one provider, plus its circuit breaker.
+    The circuit opens once the error rate over the last WINDOW calls reaches ERROR_THRESHOLD,
+    stays open for COOLDOWN seconds, then lets a single probe call through (half-open).
+    Every provider call is admitted through claim(), so no other call slips in beside the probe.
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.outcomes: Deque[bool] = deque(maxlen=WINDOW)
+        self.latency_ewma: Optional[float] = None
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def claim(self) -> str:
+        """
+        Admit one provider call.
+        Returns:
+            str: CLOSED for a normal call, or HALF_OPEN if this call is the single probe.
+        Raises:
+            CircuitOpenError: If the circuit is open or another call is already probing.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return CLOSED
+            if self.state == OPEN and time.monotonic() - self.opened_at >= COOLDOWN:
+                self.state = HALF_OPEN
+                logger.info(f"Circuit for {self.provider} half-open, probing")
+                return HALF_OPEN
+        raise CircuitOpenError(f"Circuit for {self.provider} is open")
+
+    def allow(self) -> bool:
+        try:
+            self.claim()
+        except CircuitOpenError:
+            return False
+        return True
+
+    def available(self) -> bool:
+        # Like allow(), but without claiming the half-open probe
+        with self._lock:
+            return self.state == CLOSED or (self.state == OPEN and time.monotonic() - self.opened_at >= COOLDOWN)
+
+    def record_success(self, seconds: float) -> None:
+        with self._lock:
+            self.outcomes.append(True)
+            self.latency_ewma = seconds if self.latency_ewma is None else (
+                EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.latency_ewma
+            )
+            if self.state != CLOSED:
+                logger.info(f"Circuit for {self.provider} closed")
+                self.state = CLOSED
+                self.outcomes.clear()
+
+    def record_cancelled(self) -> None:
+        """
+        The probe was cancelled before it finished (a hedge loser, a cancelled prefetch, a client
+        disconnect). That says nothing about the provider, so reopen for another cooldown
+        instead of staying half-open with no probe in flight.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                logger.info(f"Circuit for {self.provider} probe cancelled, reopened")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.outcomes.append(False)
+            tripped = len(self.outcomes) >= MIN_REQUESTS and self.error_rate >= ERROR_THRESHOLD
+            if self.state == HALF_OPEN or (self.state == CLOSED and tripped):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                metrics.incr(f"circuit.{self.provider}.opened")
+                logger.warning(f"Circuit for {self.provider} opened (error rate {self.error_rate:.0%})")
+
+
+class HealthRegistry:
+    def __init__(self):
+        self._providers: Dict[str, ProviderHealth] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, provider: str) -> ProviderHealth:
+        with self._lock:
+            if provider not in self._providers:
+                self._providers[provider] = ProviderHealth(provider)
+            return self._providers[provider]
+
+    def route(self, provider: str, candidates: List[str]) -> str:
+        """
+        Pick the engine to send a query to.
+        Args:
+            provider (str): The requested provider.
+            candidates (List[str]): All providers that can answer a search.
+        Returns:
+            str: The requested provider if its circuit is closed or due a probe, otherwise
+                 the healthy alternative with the lowest latency EWMA. The call itself claims
+                 the probe (ProviderHealth.claim), so concurrent callers can't all probe.
+        Raises:
+            CircuitOpenError: If every provider's circuit is open.
+        """
+        if self[provider].available():
+            return provider
+        alternative = self.alternative(provider, candidates)
+        if alternative is None:
+            metrics.incr(f"circuit.{provider}.rejected")
+            raise CircuitOpenError(f"{provider} search is unavailable and no healthy engine can stand in")
+        metrics.incr(f"circuit.{provider}.rerouted")
+        logger.info(f"Circuit for {provider} open, rerouting to {alternative}")
+        return alternative
+
+    def alternative(self, provider: str, candidates: List[str]) -> Optional[str]:
+        healthy = [c for c in candidates if c != provider and self[c].state == CLOSED]
+        if not healthy:
+            return None
+        return min(healthy, key=lambda c: self[c].latency_ewma if self[c].latency_ewma is not None else float("inf"))
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            providers = list(self._providers.values())
+        return {
+            p.provider: {"state": p.state, "error_rate": p.error_rate, "latency_ewma": p.latency_ewma}
+            for p in providers
+        }
+
+
+health = HealthRegistry()
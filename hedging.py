@@ -0,0 +1,155 @@
+import os
+import asyncio
+import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from metrics import metrics
+from health import health
+
+logger = logging.getLogger(__name__)
+
+HEDGING_ENABLED = os.environ.get("SEARCH_HEDGING", "1") == "1"
+HEDGE_QUANTILE = float(os.environ.get("SEARCH_HEDGE_QUANTILE", "0.9"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("SEARCH_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY = float(os.environ.get("SEARCH_HEDGE_DEFAULT_DELAY", "15"))
+
+# Which engine to race against a slow primary
+HEDGE_SECONDARIES: Dict[str, str] = {
+    provider: os.environ.get(f"SEARCH_HEDGE_{provider.upper()}", secondary)
+    for provider, secondary in {"openai": "exa", "exa": "duckduckgo", "duckduckgo": "exa"}.items()
+}
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("SEARCH_HEDGE_WORKERS", "32")),
+    thread_name_prefix="hedge",
+)
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies per provider.
+    """
+
+    def __init__(self, window: int):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, provider: str, seconds: float) -> None:
+        with self._lock:
+            self._samples[provider].append(seconds)
+
+    def quantile(self, provider: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples[provider])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+latency = LatencyTracker(window=int(os.environ.get("SEARCH_HEDGE_WINDOW", "200")))
+
+
+def hedge_delay(provider: str) -> float:
+    """
+    How long to wait on the primary before firing the secondary.
+    Args:
+        provider (str): The primary provider.
+    Returns:
+        float: The tracked latency quantile, or the default delay until enough samples exist.
+    """
+    tracked = latency.quantile(provider, HEDGE_QUANTILE)
+    return HEDGE_DEFAULT_DELAY if tracked is None else tracked
+
+
+def hedge_stats() -> Dict[str, float]:
+    stats = metrics.snapshot("hedge.")
+    for provider in HEDGE_SECONDARIES:
+        requests = stats.get(f"hedge.{provider}.requests", 0)
+        if requests:
+            stats[f"hedge.{provider}.rate"] = stats.get(f"hedge.{provider}.hedged", 0) / requests
+    return stats
+
+
+def _secondary(provider: str) -> Optional[str]:
+    secondary = HEDGE_SECONDARIES.get(provider)
+    if not HEDGING_ENABLED or not secondary or secondary == provider or not health[secondary].available():
+        return None
+    return secondary
+
+
+def hedged(provider: str, query: str, call: Callable[[str, str], Any]) -> Tuple[str, Any]:
+    """
+    Call the primary provider, racing a secondary engine if it is slower than its tracked p90.
+    Args:
+        provider (str): The primary provider.
+        query (str): The query to search for.
+        call (Callable): call(provider, query) performing the actual fetch.
+    Returns:
+        Tuple[str, Any]: The provider that answered and its result.
+    """
+    secondary = _secondary(provider)
+    if secondary is None:
+        return provider, call(provider, query)
+    metrics.incr(f"hedge.{provider}.requests")
+    primary = _executor.submit(call, provider, query)
+    done, _ = wait([primary], timeout=hedge_delay(provider))
+    if done:
+        return provider, primary.result()
+    metrics.incr(f"hedge.{provider}.hedged")
+    logger.info(f"Hedging slow {provider} search with {secondary}: {query}")
+    backup = _executor.submit(call, secondary, query)
+    futures = {primary: provider, backup: secondary}
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                continue
+            # Threads cannot be interrupted; a losing call finishes in the background and still fills the cache
+            for loser in pending:
+                loser.cancel()
+            if futures[future] == secondary:
+                metrics.incr(f"hedge.{provider}.secondary_wins")
+            return futures[future], result
+    raise error
+
+
+async def ahedged(provider: str, query: str, call: Callable[[str, str], Awaitable[Any]]) -> Tuple[str, Any]:
+    """
+    Async counterpart of hedged(); the losing call is cancelled.
+    """
+    secondary = _secondary(provider)
+    if secondary is None:
+        return provider, await call(provider, query)
+    metrics.incr(f"hedge.{provider}.requests")
+    tasks = {asyncio.create_task(call(provider, query)): provider}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay(provider))
+        if done:
+            return provider, done.pop().result()
+        metrics.incr(f"hedge.{provider}.hedged")
+        logger.info(f"Hedging slow {provider} search with {secondary}: {query}")
+        tasks[asyncio.create_task(call(secondary, query))] = secondary
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                if tasks[task] == secondary:
+                    metrics.incr(f"hedge.{provider}.secondary_wins")
+                return tasks[task], task.result()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
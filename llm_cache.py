@@ -0,0 +1,104 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import warnings
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+from metrics import metrics
+from sqlite_store import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "0") == "1"
+
+# Set per request (e.g. from the X-LLM-Cache: bypass header) to skip cache reads
+llm_cache_bypass: ContextVar[bool] = ContextVar("llm_cache_bypass", default=False)
+
+# generation_info key marking a generation replayed from the cache, so callbacks can tell it made no API call
+CACHE_HIT = "llm_cache_hit"
+
+
+def _model(llm_string: str) -> str:
+    match = re.search(r'"model(?:_name)?": "([^"]+)"', llm_string)
+    return match.group(1) if match else "unknown"
+
+
+class LLMCache(SqliteStore, BaseCache):
+    """
+    Persistent exact-match cache for chat model calls, usable as ChatOpenAI(cache=...).
+    Keyed by a hash of the model string (model plus every parameter and bound tool) and the
+    serialized message list, stored in SQLite with LRU eviction above max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(path, [
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_lru ON llm_cache (last_access)",
+        ])
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        model = _model(llm_string)
+        if llm_cache_bypass.get():
+            metrics.incr(f"llm_cache.{model}.bypassed")
+            return None
+        key = self._key(prompt, llm_string)
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            metrics.incr(f"llm_cache.{model}.misses")
+            return None
+        conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        metrics.incr(f"llm_cache.{model}.hits")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            generations = loads(row[0])
+        for generation in generations:
+            generation.generation_info = {**(generation.generation_info or {}), CACHE_HIT: True}
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        payload = dumps(list(return_val))
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+            (self._key(prompt, llm_string), _model(llm_string), payload, len(payload), time.time()),
+        )
+        self._evict("llm_cache", self.max_bytes)
+
+    def clear(self, **kwargs: Any) -> None:
+        self._connect().execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, float]:
+        stats = metrics.snapshot("llm_cache.")
+        for name in list(stats):
+            if name.endswith(".hits"):
+                model = name[len("llm_cache."):-len(".hits")]
+                lookups = stats[name] + stats.get(f"llm_cache.{model}.misses", 0)
+                stats[f"llm_cache.{model}.hit_rate"] = stats[name] / lookups
+        return stats
+
+
+llm_cache = LLMCache(
+    path=os.environ.get("LLM_CACHE_PATH", ".cache/llm_cache.sqlite"),
+    max_bytes=int(os.environ.get("LLM_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+) if LLM_CACHE_ENABLED else None
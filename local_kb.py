@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import mmap
+import fcntl
+import hashlib
+import logging
+from collections import Counter, defaultdict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from compression import tokenize, BM25_K1, BM25_B
+from results import Citation, SearchResult, truncate, dedupe_citations
+
+logger = logging.getLogger(__name__)
+
+KB_SOURCE_DIR = os.environ.get("KB_SOURCE_DIR", "knowledge_base")
+KB_INDEX_DIR = os.environ.get("KB_INDEX_DIR", ".cache/kb_index")
+KB_EXTENSIONS = (".txt", ".md")
+PASSAGE_CHARS = int(os.environ.get("KB_PASSAGE_CHARS", "1200"))
+TOP_K = int(os.environ.get("KB_TOP_K", "5"))
+
+
+def _source_files(source_dir: str) -> List[str]:
+    files = []
+    for root, _, names in os.walk(source_dir):
+        files.extend(os.path.join(root, n) for n in names if n.lower().endswith(KB_EXTENSIONS))
+    return sorted(files)
+
+
+def _fingerprint(files: List[str]) -> str:
+    digest = hashlib.sha256()
+    for path in files:
+        stat = os.stat(path)
+        digest.update(f"{path}\x00{stat.st_size}\x00{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _passages(text: str) -> List[str]:
+    # Pack paragraphs into passages of roughly PASSAGE_CHARS so each hit is self-contained
+    passages, current = [], ""
+    for paragraph in (p.strip() for p in re.split(r"\n\s*\n", text)):
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) > PASSAGE_CHARS:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        passages.append(current)
+    return passages
+
+
+class LocalKnowledgeBase:
+    """
+    BM25 retrieval over reference documents we supply (plain text or markdown).
+    The inverted index is built once into KB_INDEX_DIR as flat numpy arrays and rebuilt
+    only when the source files change; every process memory-maps the same files.
+    """
+
+    def __init__(self, source_dir: str, index_dir: str):
+        self.source_dir = source_dir
+        self.index_dir = index_dir
+        self.vocab = {}
+        self.sources: List[str] = []
+        self.n_passages = 0
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def load(self) -> None:
+        """
+        Memory-map the index, building it first if it is missing or stale.
+        """
+        files = _source_files(self.source_dir)
+        fingerprint = _fingerprint(files)
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(self._path(".lock"), "w") as lock:
+            # Only one worker rebuilds; the others wait and then map the finished index
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            meta = self._read_meta()
+            if meta is None or meta["fingerprint"] != fingerprint:
+                self.build(files, fingerprint)
+                meta = self._read_meta()
+        self.vocab = meta["vocab"]
+        self.sources = meta["sources"]
+        self.n_passages = meta["n_passages"]
+        self.avg_length = meta["avg_length"]
+        if not self.n_passages:
+            logger.warning(f"Local knowledge base at {self.source_dir} is empty")
+            return
+        self.offsets = np.load(self._path("term_offsets.npy"), mmap_mode="r")
+        self.postings = np.load(self._path("postings.npy"), mmap_mode="r")
+        self.frequencies = np.load(self._path("frequencies.npy"), mmap_mode="r")
+        self.lengths = np.load(self._path("lengths.npy"), mmap_mode="r")
+        self.passage_sources = np.load(self._path("passage_sources.npy"), mmap_mode="r")
+        self.text_offsets = np.load(self._path("text_offsets.npy"), mmap_mode="r")
+        self.norm = BM25_K1 * (1 - BM25_B + BM25_B * np.asarray(self.lengths) / (self.avg_length or 1))
+        with open(self._path("passages.txt"), "rb") as f:
+            self.text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        logger.info(f"Loaded local knowledge base: {self.n_passages} passages, {len(self.vocab)} terms")
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self._path("meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def build(self, files: List[str], fingerprint: str) -> None:
+        logger.info(f"Building local knowledge base index from {len(files)} files")
+        passages, passage_sources = [], []
+        for source_id, path in enumerate(files):
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                for passage in _passages(f.read()):
+                    passages.append(passage)
+                    passage_sources.append(source_id)
+        postings = defaultdict(list)
+        lengths = []
+        for passage_id, passage in enumerate(passages):
+            tokens = tokenize(passage)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append((passage_id, tf))
+        vocab = {term: term_id for term_id, term in enumerate(sorted(postings))}
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        flat = [postings[term] for term in sorted(postings)]
+        offsets[1:] = np.cumsum([len(p) for p in flat])
+        encoded = [p.encode("utf-8") for p in passages]
+        text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        text_offsets[1:] = np.cumsum([len(e) for e in encoded])
+        self._write("term_offsets.npy", offsets)
+        self._write("postings.npy", np.array([d for p in flat for d, _ in p], dtype=np.int32))
+        self._write("frequencies.npy", np.array([tf for p in flat for _, tf in p], dtype=np.float32))
+        self._write("lengths.npy", np.array(lengths, dtype=np.float32))
+        self._write("passage_sources.npy", np.array(passage_sources, dtype=np.int32))
+        self._write("text_offsets.npy", text_offsets)
+        self._write("passages.txt", b"".join(encoded))
+        # meta.json is written last, so a complete meta means a complete index
+        self._write("meta.json", json.dumps({
+            "fingerprint": fingerprint,
+            "vocab": vocab,
+            "sources": [os.path.relpath(p, self.source_dir) for p in files],
+            "n_passages": len(passages),
+            "avg_length": (sum(lengths) / len(lengths)) if lengths else 0.0,
+        }).encode("utf-8"))
+
+    def _write(self, name: str, data) -> None:
+        # Write-then-rename, so processes still mapping the old file keep a valid view
+        tmp = self._path(f"{name}.tmp")
+        with open(tmp, "wb") as f:
+            if isinstance(data, bytes):
+                f.write(data)
+            else:
+                np.save(f, data)
+        os.replace(tmp, self._path(name))
+
+    def passage(self, passage_id: int) -> str:
+        return self.text[self.text_offsets[passage_id]:self.text_offsets[passage_id + 1]].decode("utf-8")
+
+    def query(self, query: str, k: int = TOP_K) -> List[Tuple[int, float]]:
+        """
+        Rank passages against a query with BM25.
+        Args:
+            query (str): The query text.
+            k (int): Number of passages to return.
+        Returns:
+            List[Tuple[int, float]]: (passage id, score) pairs, best first.
+        """
+        if not self.n_passages:
+            return []
+        scores = np.zeros(self.n_passages, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.postings[start:end]
+            tf = self.frequencies[start:end]
+            idf = np.log(1 + (self.n_passages - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + self.norm[docs])
+        k = min(k, self.n_passages)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [(int(i), float(scores[i])) for i in top[np.argsort(-scores[top])] if scores[i] > 0]
+
+    def search(self, query: str, k: int = TOP_K) -> SearchResult:
+        hits = self.query(query, k)
+        sections, citations = [], []
+        for passage_id, _ in hits:
+            source = self.sources[self.passage_sources[passage_id]]
+            sections.append(f"[{source}]\n{self.passage(passage_id)}")
+            citations.append(Citation(title=source, url=f"kb://{source}"))
+        text = "\n\n".join(sections) or "No local reference documents matched this query."
+        return SearchResult(
+            provider="local_kb", text=truncate(text, k * PASSAGE_CHARS), citations=dedupe_citations(citations)
+        )
+
+
+local_kb = LocalKnowledgeBase(KB_SOURCE_DIR, KB_INDEX_DIR)
+local_kb.load()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    files = _source_files(KB_SOURCE_DIR)
+    local_kb.build(files, _fingerprint(files))
+    local_kb.load()
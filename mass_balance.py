@@ -0,0 +1,139 @@
+from typing import Dict, List, Tuple
+
+from pydantic import BaseModel
+
+# Compositions are percentages; rendered results are rounded to this many decimals
+PRECISION = 4
+
+
+def _fmt(value: float) -> str:
+    return f"{round(value, PRECISION):g}"
+
+
+def resolve_category(composition: Dict[str, float], category: str) -> str:
+    # Agents are loose with case and spacing, so match on a normalized name
+    if category in composition:
+        return category
+    key = " ".join(category.lower().split())
+    for name in composition:
+        if " ".join(name.lower().split()) == key:
+            return name
+    raise ValueError(f"Unknown category '{category}'; composition has {sorted(composition)}")
+
+
+def normalize(composition: Dict[str, float]) -> Dict[str, float]:
+    """
+    Scale a composition so its components sum to 100%.
+    Args:
+        composition (Dict[str, float]): Component name to amount (percentage or mass).
+    Returns:
+        Dict[str, float]: Component name to percentage, summing to 100.
+    """
+    if any(value < 0 for value in composition.values()):
+        raise ValueError("Composition values must not be negative")
+    total = sum(composition.values())
+    if total <= 0:
+        raise ValueError("Composition is empty; nothing to normalize")
+    return {name: value * 100 / total for name, value in composition.items()}
+
+
+class MassBalance(BaseModel):
+    """
+    One separation step on a basis of 100 mass units of feed.
+    """
+    feed: Dict[str, float]
+    removed: Dict[str, float]
+    remaining: Dict[str, float]
+    composition: Dict[str, float]
+
+    @property
+    def mass_yield(self) -> float:
+        return sum(self.remaining.values())
+
+    def render(self) -> str:
+        """
+        Render the balance as a table for the agent's message history.
+        Returns:
+            str: Per-component feed, removed, remaining and normalized output, plus the totals.
+        """
+        lines = ["component | feed % | removed | remaining | output %", "--- | --- | --- | --- | ---"]
+        for name, feed in self.feed.items():
+            lines.append(
+                f"{name} | {_fmt(feed)} | {_fmt(self.removed.get(name, 0.0))} | {_fmt(self.remaining[name])} | {_fmt(self.composition[name])}"
+            )
+        removed = _fmt(sum(self.removed.values()))
+        lines.append(f"total | 100 | {removed} | {_fmt(self.mass_yield)} | 100")
+        lines.append(f"\nMass yield: {_fmt(self.mass_yield)}% of the feed; {removed}% removed.")
+        return "\n".join(lines)
+
+
+def apply_removal_efficiencies(composition: Dict[str, float], efficiencies: Dict[str, float]) -> MassBalance:
+    """
+    Remove a share of each listed component and renormalize the rest.
+    Args:
+        composition (Dict[str, float]): Feed composition; normalized to 100% first.
+        efficiencies (Dict[str, float]): Component name to the % of that component removed (0-100).
+    Returns:
+        MassBalance: Removed and remaining mass per 100 units of feed, and the new composition.
+    """
+    feed = normalize(composition)
+    removed = {}
+    for category, pct in efficiencies.items():
+        if not 0 <= pct <= 100:
+            raise ValueError(f"Removal efficiency for '{category}' must be between 0 and 100, got {pct}")
+        name = resolve_category(feed, category)
+        removed[name] = feed[name] * pct / 100
+    remaining = {name: value - removed.get(name, 0.0) for name, value in feed.items()}
+    return MassBalance(feed=feed, removed=removed, remaining=remaining, composition=normalize(remaining))
+
+
+def remove_fraction(composition: Dict[str, float], category: str, pct: float) -> MassBalance:
+    """
+    Remove pct % of one component and renormalize the rest.
+    Args:
+        composition (Dict[str, float]): Feed composition; normalized to 100% first.
+        category (str): The component to remove from.
+        pct (float): The % of that component removed (0-100).
+    Returns:
+        MassBalance: The resulting balance.
+    """
+    return apply_removal_efficiencies(composition, {category: pct})
+
+
+def chain(composition: Dict[str, float], stages: List[Tuple[str, Dict[str, float]]]) -> List[Tuple[str, MassBalance]]:
+    """
+    Run several removal steps in sequence, each on the previous step's output.
+    Args:
+        composition (Dict[str, float]): Feed composition.
+        stages (List[Tuple[str, Dict[str, float]]]): (stage name, removal efficiencies) in process order.
+    Returns:
+        List[Tuple[str, MassBalance]]: Each stage with its balance.
+    """
+    balances = []
+    for name, efficiencies in stages:
+        balance = apply_removal_efficiencies(composition, efficiencies)
+        balances.append((name, balance))
+        composition = balance.composition
+    return balances
+
+
+def mass_balance_report(composition: Dict[str, float], stages: List[Tuple[str, Dict[str, float]]]) -> str:
+    """
+    Report a multi-stage mass balance, including the overall yield on the original feed.
+    Args:
+        composition (Dict[str, float]): Feed composition.
+        stages (List[Tuple[str, Dict[str, float]]]): (stage name, removal efficiencies) in process order.
+    Returns:
+        str: One table per stage followed by the overall yield and final composition.
+    """
+    balances = chain(composition, stages)
+    sections, overall = [], 100.0
+    for name, balance in balances:
+        overall *= balance.mass_yield / 100
+        sections.append(f"## {name}\n{balance.render()}")
+    final = balances[-1][1].composition if balances else normalize(composition)
+    sections.append(
+        f"## Overall\nMass yield: {_fmt(overall)}% of the original feed.\n"
+        + "\n".join(f"{name}: {_fmt(value)}%" for name, value in final.items())
+    )
+    return "\n\n".join(sections)
@@ -0,0 +1,138 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional
+
+from metrics import metrics
+from search import search, asearch
+from results import SearchResult, content_hash, dedupe_citations
+
+logger = logging.getLogger(__name__)
+
+META_SEARCH_PROVIDERS = ["openai", "exa", "duckduckgo"]
+DEFAULT_DEADLINE = float(os.environ["META_SEARCH_DEADLINE"]) if os.environ.get("META_SEARCH_DEADLINE") else None
+DEFAULT_MIN_RESULTS = int(os.environ["META_SEARCH_MIN_RESULTS"]) if os.environ.get("META_SEARCH_MIN_RESULTS") else None
+
+# Stragglers past the deadline keep running so their results still land in the cache
+_background_tasks = set()
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("META_SEARCH_WORKERS", "16")),
+    thread_name_prefix="meta_search",
+)
+
+
+def merge(results: Dict[str, SearchResult]) -> SearchResult:
+    """
+    Merge per-provider results, dropping repeated paragraphs and citations.
+    Args:
+        results (Dict[str, SearchResult]): Provider name to its normalized result.
+    Returns:
+        SearchResult: One result with a section per provider and a de-duplicated source list.
+    """
+    sections, citations = [], []
+    seen_text = set()
+    for provider, result in results.items():
+        kept = []
+        for paragraph in re.split(r"\n\s*\n", result.text):
+            digest = content_hash(paragraph)
+            if paragraph.strip() and digest not in seen_text:
+                seen_text.add(digest)
+                kept.append(paragraph.strip())
+        if kept:
+            sections.append(f"[{result.provider}]\n" + "\n\n".join(kept))
+        citations.extend(result.citations)
+    return SearchResult(
+        provider="+".join(results),
+        text="\n\n".join(sections) or "No results found.",
+        citations=dedupe_citations(citations),
+        truncated=any(r.truncated for r in results.values()),
+    )
+
+
+def meta_search(
+    query: str,
+    providers: Optional[List[str]] = None,
+    min_results: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> SearchResult:
+    """
+    Query several search providers concurrently and merge what comes back.
+    Args:
+        query (str): The query to search for.
+        providers (List[str]): Providers to fan out to; defaults to all of them.
+        min_results (int): Return as soon as this many providers have answered (first-N-wins).
+        deadline (float): Latency budget in seconds; return whatever has arrived by then.
+    Returns:
+        SearchResult: Merged answers and citations from the providers that answered in time.
+    """
+    providers, min_results, deadline = _resolve(providers, min_results, deadline)
+    started = time.monotonic()
+    futures = {_executor.submit(search, provider, query, fallback=False): provider for provider in providers}
+    results, failed = {}, []
+    pending = set(futures)
+    while pending and len(results) < min_results:
+        remaining = None if deadline is None else deadline - (time.monotonic() - started)
+        if remaining is not None and remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        _collect(done, futures, results, failed)
+    return _finish(query, providers, results, failed, [futures[f] for f in pending], started)
+
+
+async def ameta_search(
+    query: str,
+    providers: Optional[List[str]] = None,
+    min_results: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> SearchResult:
+    """
+    Async counterpart of meta_search(), fanning out as tasks on the running event loop.
+    """
+    providers, min_results, deadline = _resolve(providers, min_results, deadline)
+    started = time.monotonic()
+    tasks = {asyncio.create_task(asearch(provider, query, fallback=False)): provider for provider in providers}
+    results, failed = {}, []
+    pending = set(tasks)
+    while pending and len(results) < min_results:
+        remaining = None if deadline is None else deadline - (time.monotonic() - started)
+        if remaining is not None and remaining <= 0:
+            break
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        _collect(done, tasks, results, failed)
+    for task in pending:
+        _background_tasks.add(task)
+        task.add_done_callback(_forget)
+    return _finish(query, providers, results, failed, [tasks[t] for t in pending], started)
+
+
+def _forget(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background meta search task failed: {str(task.exception())}")
+
+
+def _resolve(providers, min_results, deadline):
+    providers = providers or META_SEARCH_PROVIDERS
+    min_results = min(min_results or DEFAULT_MIN_RESULTS or len(providers), len(providers))
+    return providers, min_results, deadline or DEFAULT_DEADLINE
+
+
+def _collect(done, futures, results, failed) -> None:
+    for future in done:
+        provider = futures[future]
+        try:
+            results[provider] = future.result()
+        except Exception as e:
+            logger.error(f"Meta search provider {provider} failed: {str(e)}")
+            failed.append(provider)
+
+
+def _finish(query, providers, results, failed, timed_out, started) -> SearchResult:
+    elapsed = time.monotonic() - started
+    metrics.observe("meta_search.latency", elapsed)
+    metrics.incr("meta_search.timed_out_providers", len(timed_out))
+    logger.info(f"Meta search answered by {list(results)} in {elapsed:.2f}s (timed out: {timed_out}, failed: {failed})")
+    return merge({provider: results[provider] for provider in providers if provider in results})
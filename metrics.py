@@ -0,0 +1,44 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+
+class Metrics:
+    """
+    Minimal thread-safe, in-process counters and timers.
+    Counters are keyed by dotted names, e.g. "search_cache.openai.hits".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Record a duration as a count plus a running total, so averages can be derived.
+        Args:
+            name (str): Metric name.
+            seconds (float): Observed duration in seconds.
+        """
+        with self._lock:
+            self._counters[f"{name}.count"] += 1
+            self._counters[f"{name}.total_seconds"] += seconds
+
+    def get(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self, prefix: str = "") -> Dict[str, float]:
+        with self._lock:
+            return {k: v for k, v in self._counters.items() if k.startswith(prefix)}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+metrics = Metrics()
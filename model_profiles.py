@@ -0,0 +1,65 @@
+import os
+import json
+import logging
+from typing import Dict, Literal, Optional, Tuple
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+AGENT_NAMES = [
+    "supervisor",
+    "sorting_supervisor",
+    "sorting_engineer",
+    "chlorine_reduction_specialist",
+    "shredding_purification_technician",
+    "R4_process_engineer",
+    "water_bath_process_engineer",
+]
+
+
+class ModelProfile(BaseModel):
+    model: str
+    reasoning_effort: Optional[Literal["low", "medium", "high"]] = None
+    max_tokens: Optional[int] = None
+    timeout: Optional[float] = None
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    frequency_penalty: Optional[float] = None
+    presence_penalty: Optional[float] = None
+
+    model_config = {"frozen": True}
+
+
+def load_presets(path: str) -> Tuple[Dict[str, Dict[str, ModelProfile]], str]:
+    """
+    Load named model presets (e.g. fast, balanced, thorough) from a JSON file.
+    Args:
+        path (str): Path to the profiles file.
+    Returns:
+        Tuple[Dict[str, Dict[str, ModelProfile]], str]: Preset name to agent name to model profile, and the default preset name.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    presets = {}
+    for preset, agents in config["presets"].items():
+        missing = set(AGENT_NAMES) - set(agents)
+        if missing:
+            raise ValueError(f"Model preset '{preset}' is missing profiles for: {', '.join(sorted(missing))}")
+        presets[preset] = {name: ModelProfile(**agents[name]) for name in AGENT_NAMES}
+    return presets, config.get("default_preset", next(iter(presets)))
+
+
+PRESETS, _file_default = load_presets(
+    os.environ.get("MODEL_PROFILES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_profiles.json"))
+)
+DEFAULT_PRESET = os.environ.get("MODEL_PRESET", _file_default)
+if DEFAULT_PRESET not in PRESETS:
+    raise ValueError(f"Default model preset '{DEFAULT_PRESET}' is not defined")
+logger.info(f"Loaded model presets {list(PRESETS)} (default: {DEFAULT_PRESET})")
+
+
+def get_preset(name: str) -> Dict[str, ModelProfile]:
+    if name not in PRESETS:
+        raise ValueError(f"Unknown model preset '{name}'. Available presets: {', '.join(PRESETS)}")
+    return PRESETS[name]
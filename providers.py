@@ -0,0 +1,249 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import httpx
+from pydantic import BaseModel
+from openai import OpenAI, AsyncOpenAI
+from langchain_community.tools import DuckDuckGoSearchRun
+from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+
+logger = logging.getLogger(__name__)
+
+EXA_BASE_URL = "https://api.exa.ai"
+
+
+def exa_api_key() -> str:
+    """
+    The Exa API key. Never left to the OpenAI SDK's default, which would send OPENAI_API_KEY to Exa.
+    Raises:
+        RuntimeError: If EXA_API_KEY is not set.
+    """
+    api_key = os.environ.get("EXA_API_KEY")
+    if not api_key:
+        raise RuntimeError("EXA_API_KEY is not set; the Exa search provider is unavailable")
+    return api_key
+
+
+class ProviderConfig(BaseModel):
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 120.0
+
+    @classmethod
+    def from_env(cls, provider: str, **defaults) -> "ProviderConfig":
+        """
+        Build a provider config, letting environment variables override the defaults.
+        Args:
+            provider (str): Provider name, used as the env prefix (e.g. EXA_MAX_CONNECTIONS).
+            **defaults: Per-provider default values.
+        Returns:
+            ProviderConfig: The resolved configuration.
+        """
+        values = cls(**defaults).model_dump()
+        prefix = provider.upper()
+        for field, value in values.items():
+            env_value = os.environ.get(f"{prefix}_{field.upper()}")
+            if env_value is not None:
+                values[field] = type(value)(env_value)
+        return cls(**values)
+
+    def http_client(self) -> httpx.Client:
+        return httpx.Client(limits=self._limits(), timeout=self._timeout())
+
+    def async_http_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(limits=self._limits(), timeout=self._timeout())
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+
+PROVIDER_CONFIGS: Dict[str, ProviderConfig] = {
+    "openai": ProviderConfig.from_env("openai", max_connections=50, max_keepalive_connections=20, read_timeout=600.0),
+    "exa": ProviderConfig.from_env("exa"),
+    "duckduckgo": ProviderConfig.from_env("duckduckgo", max_connections=4, read_timeout=30.0),
+}
+
+
+class ProviderRegistry:
+    """
+    Process-wide registry of long-lived provider clients.
+    Clients are created lazily on first use and shared by every tool and agent,
+    so connections are kept alive between calls instead of re-handshaking.
+    """
+
+    def __init__(self, configs: Dict[str, ProviderConfig]):
+        self.configs = configs
+        self._clients: Dict[str, object] = {}
+        self._http_clients: Dict[str, httpx.Client] = {}
+        self._async_http_clients: Dict[str, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+        self.duckduckgo_slots = threading.BoundedSemaphore(configs["duckduckgo"].max_connections)
+        # Async DDG calls queue here instead of occupying the event loop's default executor
+        self.duckduckgo_executor = ThreadPoolExecutor(
+            max_workers=configs["duckduckgo"].max_connections, thread_name_prefix="duckduckgo"
+        )
+
+    def http_client(self, provider: str) -> httpx.Client:
+        with self._lock:
+            if provider not in self._http_clients:
+                logger.info(f"Creating pooled HTTP client for {provider}")
+                self._http_clients[provider] = self.configs[provider].http_client()
+            return self._http_clients[provider]
+
+    def async_http_client(self, provider: str) -> httpx.AsyncClient:
+        with self._lock:
+            if provider not in self._async_http_clients:
+                logger.info(f"Creating pooled async HTTP client for {provider}")
+                self._async_http_clients[provider] = self.configs[provider].async_http_client()
+            return self._async_http_clients[provider]
+
+    def _get(self, provider: str, factory):
+        client = self._clients.get(provider)
+        if client is None:
+            client = factory()
+            with self._lock:
+                client = self._clients.setdefault(provider, client)
+        return client
+
+    def openai(self) -> OpenAI:
+        return self._get("openai", lambda: OpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            http_client=self.http_client("openai"),
+        ))
+
+    def exa(self) -> OpenAI:
+        return self._get("exa", lambda: OpenAI(
+            base_url=EXA_BASE_URL,
+            api_key=exa_api_key(),
+            http_client=self.http_client("exa"),
+        ))
+
+    def async_openai(self) -> AsyncOpenAI:
+        return self._get("async_openai", lambda: AsyncOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            http_client=self.async_http_client("openai"),
+        ))
+
+    def async_exa(self) -> AsyncOpenAI:
+        return self._get("async_exa", lambda: AsyncOpenAI(
+            base_url=EXA_BASE_URL,
+            api_key=exa_api_key(),
+            http_client=self.async_http_client("exa"),
+        ))
+
+    def duckduckgo(self) -> DuckDuckGoSearchRun:
+        return self._get("duckduckgo", lambda: DuckDuckGoSearchRun(
+            api_wrapper=DuckDuckGoSearchAPIWrapper(max_results=int(os.environ.get("DUCKDUCKGO_MAX_RESULTS", "5")))
+        ))
+
+    def close(self) -> None:
+        """
+        Close the pooled sync HTTP clients and forget every client. Async clients are only
+        dropped here; call aclose() from the event loop to close their connections too.
+        """
+        with self._lock:
+            for client in self._http_clients.values():
+                client.close()
+            self._http_clients.clear()
+            self._async_http_clients.clear()
+            self._clients.clear()
+
+    async def aclose(self) -> None:
+        """
+        Close every pooled client, sync and async, e.g. on application shutdown.
+        The OpenAI and Exa clients run on these pools, so closing the pools closes them.
+        """
+        with self._lock:
+            async_http_clients = list(self._async_http_clients.values())
+            self._async_http_clients.clear()
+        for client in async_http_clients:
+            await client.aclose()
+        self.close()
+
+
+registry = ProviderRegistry(PROVIDER_CONFIGS)
+
+
+OPENAI_WEB_SEARCH_REQUEST = {
+    "model": "gpt-4o",
+    "tools": [{"type": "web_search_preview", "search_context_size": "high"}],
+}
+
+
+def _exa_request(query: str) -> dict:
+    return {
+        "model": "exa-pro",
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": query}
+        ],
+        "extra_body": {"text": False},
+    }
+
+
+def _exa_info(completion) -> Dict[str, Optional[object]]:
+    info_dict = {}
+    info_dict['content'] = completion.choices[0].message.content if completion.choices else "No content found."
+    info_dict['citations'] = completion.choices[0].message.citations if completion.choices else "No citations found."
+    return info_dict
+
+
+def openai_web_search(query: str):
+    return registry.openai().responses.create(input=query, **OPENAI_WEB_SEARCH_REQUEST)
+
+
+async def aopenai_web_search(query: str):
+    return await registry.async_openai().responses.create(input=query, **OPENAI_WEB_SEARCH_REQUEST)
+
+
+def exa_answer(query: str) -> Dict[str, Optional[object]]:
+    return _exa_info(registry.exa().chat.completions.create(**_exa_request(query)))
+
+
+async def aexa_answer(query: str) -> Dict[str, Optional[object]]:
+    return _exa_info(await registry.async_exa().chat.completions.create(**_exa_request(query)))
+
+
+def duckduckgo_search(query: str) -> str:
+    # The DDG wrapper opens its own session per query, so the pool bound is enforced here
+    with registry.duckduckgo_slots:
+        return registry.duckduckgo().run(query)
+
+
+async def aduckduckgo_search(query: str) -> str:
+    # The DDG client is blocking only; run it on the bounded DDG pool off the event loop
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(registry.duckduckgo_executor, duckduckgo_search, query)
+
+
+SEARCH_PROVIDERS = {
+    "openai": openai_web_search,
+    "exa": exa_answer,
+    "duckduckgo": duckduckgo_search,
+}
+
+ASYNC_SEARCH_PROVIDERS = {
+    "openai": aopenai_web_search,
+    "exa": aexa_answer,
+    "duckduckgo": aduckduckgo_search,
+}
+
+# Rate limiter key ("provider:model") for each search provider
+SEARCH_RATE_LIMIT_KEYS = {
+    "openai": f"openai:{OPENAI_WEB_SEARCH_REQUEST['model']}",
+    "exa": "exa:exa-pro",
+    "duckduckgo": "duckduckgo",
+}
@@ -0,0 +1,153 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from metrics import metrics
+from llm_cache import CACHE_HIT
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at per_minute / 60 per second.
+    The level may go negative when actual usage is only known after a call, which
+    makes later callers wait until the debt is paid off.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float) -> float:
+        """
+        Reserve capacity now and return how long the caller must wait for it to be covered.
+        """
+        with self._lock:
+            self._refill()
+            self.level -= amount
+            return max(0.0, -self.level / self.rate)
+
+
+class RateLimiter(BaseRateLimiter):
+    """
+    Requests-per-minute and tokens-per-minute limiter for one provider/model.
+    Requests are reserved up front; tokens are charged after each call from the actual
+    (or estimated) usage, and new calls wait while the token bucket is in debt.
+    Usable directly as a ChatOpenAI rate_limiter and by the search tools.
+    """
+
+    def __init__(self, name: str, rpm: Optional[float], tpm: Optional[float]):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    def _wait(self, blocking: bool) -> Optional[float]:
+        token_wait = self.tokens.wait_time(0) if self.tokens else 0.0
+        if not blocking:
+            if token_wait or (self.requests and self.requests.wait_time(1)):
+                return None
+        request_wait = self.requests.take(1) if self.requests else 0.0
+        return max(token_wait, request_wait)
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        wait = self._wait(blocking)
+        if wait is None:
+            return False
+        if wait:
+            logger.info(f"Rate limiter {self.name} waiting {wait:.2f}s for capacity")
+            time.sleep(wait)
+        metrics.observe(f"rate_limit.{self.name}.queue_wait", wait)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        wait = self._wait(blocking)
+        if wait is None:
+            return False
+        if wait:
+            logger.info(f"Rate limiter {self.name} waiting {wait:.2f}s for capacity")
+            await asyncio.sleep(wait)
+        metrics.observe(f"rate_limit.{self.name}.queue_wait", wait)
+        return True
+
+    def record_tokens(self, tokens: float) -> None:
+        if self.tokens and tokens:
+            self.tokens.take(tokens)
+        metrics.incr(f"rate_limit.{self.name}.tokens", tokens)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Charges a ChatOpenAI call's reported token usage to its limiter's TPM bucket.
+    LangChain fires on_llm_end for LLM cache hits too, with the original call's usage;
+    those made no API call, so they are not charged.
+    """
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        generations = [g for generations in response.generations for g in generations]
+        if generations and all((g.generation_info or {}).get(CACHE_HIT) for g in generations):
+            metrics.incr(f"rate_limit.{self.limiter.name}.cached_calls")
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        total = usage.get("total_tokens")
+        if total is None:
+            total = sum(
+                (getattr(g.message, "usage_metadata", None) or {}).get("total_tokens", 0)
+                for generations in response.generations for g in generations if hasattr(g, "message")
+            )
+        self.limiter.record_tokens(total)
+
+
+def _env_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_").upper()
+
+
+class RateLimiterRegistry:
+    """
+    Process-wide limiters keyed by "provider:model", configured from the environment as
+    RATE_LIMIT_<NAME>_RPM / RATE_LIMIT_<NAME>_TPM, e.g. RATE_LIMIT_OPENAI_GPT_4_1_TPM=30000.
+    Unconfigured limits are unbounded.
+    """
+
+    def __init__(self):
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> RateLimiter:
+        with self._lock:
+            if name not in self._limiters:
+                prefix = f"RATE_LIMIT_{_env_name(name)}"
+                rpm = os.environ.get(f"{prefix}_RPM")
+                tpm = os.environ.get(f"{prefix}_TPM")
+                self._limiters[name] = RateLimiter(name, float(rpm) if rpm else None, float(tpm) if tpm else None)
+            return self._limiters[name]
+
+    def stats(self) -> Dict[str, float]:
+        return metrics.snapshot("rate_limit.")
+
+
+limiters = RateLimiterRegistry()
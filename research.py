@@ -0,0 +1,174 @@
+import time
+import asyncio
+import logging
+import argparse
+from typing import Dict, List, Optional
+
+from search import asearch
+from search_cache import search_cache
+from meta_search import META_SEARCH_PROVIDERS, ameta_search
+from local_kb import local_kb
+from results import SearchResult
+
+logger = logging.getLogger(__name__)
+
+# Standard research questions each stage's prompt makes the agent look up; {place} is filled per run
+STAGE_QUERIES: Dict[str, List[str]] = {
+    "sorting_supervisor": [
+        "percentage of large non-processable waste in {place} municipal solid waste",
+        "types of large non-processable items removed from municipal solid waste before processing",
+        "municipal solid waste categories that contain large non-processable items",
+        "municipal solid waste composition in {place}",
+    ],
+    "sorting_engineer": [
+        "magnetic separator ferrous metal removal efficiency in RDF production from MSW",
+        "eddy current separator non-ferrous metal removal efficiency in MSW sorting",
+        "glass and aggregate removal efficiency in RDF mechanical sorting",
+        "metal glass and aggregate content of municipal solid waste in {place}",
+    ],
+    "chlorine_reduction_specialist": [
+        "percentage of PVC in plastic waste in {place}",
+        "chlorine content of non-plastic municipal solid waste components such as food waste, textiles and paper",
+    ],
+    "shredding_purification_technician": [
+        "percentage of fine metals in municipal solid waste in {place}",
+        "fine ferrous and non-ferrous metal removal efficiency after shredding RDF",
+    ],
+    "R4_process_engineer": [
+        "solid recovered fuel properties moisture chlorine ash calorific value particle size uniformity",
+        "effect of vacuum drying and heating RDF at 200-260°C on moisture and calorific value",
+        "PVC thermal decomposition HCl release temperature",
+    ],
+    "water_bath_process_engineer": [
+        "effect of water bath quenching on solid fuel moisture chlorine and calorific value",
+        "surface chlorine removal by water washing of RDF fuel",
+    ],
+}
+
+
+def stage_queries(place: str, stages: Optional[List[str]] = None) -> Dict[str, List[str]]:
+    return {
+        stage: [query.format(place=place) for query in queries]
+        for stage, queries in STAGE_QUERIES.items()
+        if stages is None or stage in stages
+    }
+
+
+def coverage(place: str, providers: List[str]) -> float:
+    """
+    Fraction of a place's standard research queries that are already in the search cache.
+    """
+    keys = [(provider, query) for queries in stage_queries(place).values() for query in queries for provider in providers]
+    return sum(search_cache.contains(provider, query) for provider, query in keys) / len(keys)
+
+
+async def warm_up(
+    places: List[str],
+    providers: Optional[List[str]] = None,
+    concurrency: int = 8,
+) -> List[Dict[str, object]]:
+    """
+    Run every stage's standard research queries for each place concurrently, filling the search cache.
+    Args:
+        places (List[str]): Places to prefetch research for.
+        providers (List[str]): Search providers to warm; defaults to all of them.
+        concurrency (int): Maximum provider calls in flight.
+    Returns:
+        List[Dict[str, object]]: Per-place timing, failures and cache coverage before and after.
+    """
+    providers = providers or META_SEARCH_PROVIDERS
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(provider: str, query: str) -> bool:
+        async with slots:
+            try:
+                # No fallback: each provider's own cache entry is what the tools will look up
+                await asearch(provider, query, fallback=False)
+                return True
+            except Exception as e:
+                logger.error(f"Warm-up {provider} search failed for '{query}': {str(e)}")
+                return False
+
+    async def warm_place(place: str) -> Dict[str, object]:
+        before = coverage(place, providers)
+        started = time.monotonic()
+        queries = [query for queries in stage_queries(place).values() for query in queries]
+        outcomes = await asyncio.gather(*(run(provider, query) for query in queries for provider in providers))
+        report = {
+            "place": place,
+            "queries": len(outcomes),
+            "failed": outcomes.count(False),
+            "seconds": round(time.monotonic() - started, 2),
+            "coverage_before": round(before, 3),
+            "coverage_after": round(coverage(place, providers), 3),
+        }
+        logger.info(f"Warmed search cache for {place}: {report}")
+        return report
+
+    return list(await asyncio.gather(*(warm_place(place) for place in places)))
+
+
+async def gather_evidence(
+    place: str,
+    stages: Optional[List[str]] = None,
+    concurrency: int = 8,
+) -> Dict[str, Dict[str, List[SearchResult]]]:
+    """
+    Run the research queries of the given stages all at once, ahead of any calculation.
+    None of them depend on the upstream composition, so the whole phase takes about as
+    long as the slowest search.
+    Args:
+        place (str): The place the plant is in.
+        stages (List[str]): Stages to research; defaults to all of them.
+        concurrency (int): Maximum meta-searches in flight.
+    Returns:
+        Dict[str, Dict[str, List[SearchResult]]]: Stage to query to its local reference and merged web results.
+    """
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(query: str) -> List[SearchResult]:
+        found = [local_kb.search(query)] if local_kb.n_passages else []
+        async with slots:
+            try:
+                found.append(await ameta_search(query))
+            except Exception as e:
+                logger.error(f"Research search failed for '{query}': {str(e)}")
+        return found
+
+    started = time.monotonic()
+    queries = stage_queries(place, stages)
+    flat = [query for texts in queries.values() for query in texts]
+    found = dict(zip(flat, await asyncio.gather(*(run(query) for query in flat))))
+    logger.info(f"Gathered research for {len(flat)} queries in {time.monotonic() - started:.1f}s")
+    return {stage: {query: found[query] for query in texts} for stage, texts in queries.items()}
+
+
+def render_evidence(evidence: Dict[str, List[SearchResult]]) -> str:
+    """
+    Render one stage's evidence as text for its agent.
+    Args:
+        evidence (Dict[str, List[SearchResult]]): Query to its results.
+    Returns:
+        str: Each query followed by its results and sources.
+    """
+    return "\n\n".join(
+        f"### {query}\n" + ("\n\n".join(r.render() for r in results) or "No results.")
+        for query, results in evidence.items()
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prefetch standard MSW research for places into the search cache.")
+    parser.add_argument("places", nargs="+", help="Places to warm, e.g. Mumbai 'Los Angeles'")
+    parser.add_argument("--providers", nargs="+", choices=META_SEARCH_PROVIDERS, default=None)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    reports = asyncio.run(warm_up(args.places, args.providers, args.concurrency))
+    print(f"{'place':<24}{'queries':>8}{'failed':>8}{'seconds':>10}{'before':>9}{'after':>9}")
+    for r in reports:
+        print(f"{r['place']:<24}{r['queries']:>8}{r['failed']:>8}{r['seconds']:>10}{r['coverage_before']:>9.0%}{r['coverage_after']:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import re
+import hashlib
+from typing import Any, List, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from pydantic import BaseModel
+
+from compression import CHARS_PER_TOKEN, compress
+
+MAX_CHARS = (
+    int(os.environ["SEARCH_RESULT_MAX_TOKENS"]) * CHARS_PER_TOKEN
+    if os.environ.get("SEARCH_RESULT_MAX_TOKENS")
+    else int(os.environ.get("SEARCH_RESULT_MAX_CHARS", "6000"))
+)
+
+
+class Citation(BaseModel):
+    title: Optional[str] = None
+    url: str
+
+
+class SearchResult(BaseModel):
+    provider: str
+    text: str
+    citations: List[Citation] = []
+    truncated: bool = False
+
+    def render(self) -> str:
+        """
+        Render the result as compact text for the agent's message history.
+        Returns:
+            str: The answer text followed by a numbered source list.
+        """
+        lines = [self.text]
+        if self.citations:
+            lines.append("\nSources:")
+            lines.extend(f"[{i}] {c.title + ' - ' if c.title else ''}{c.url}" for i, c in enumerate(self.citations, 1))
+        return "\n".join(lines)
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not k.startswith("utm_")])
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower().removeprefix("www."), parts.path.rstrip("/"), query, ""))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(re.sub(r"\W+", " ", text).strip().lower().encode("utf-8")).hexdigest()
+
+
+def dedupe_citations(citations: List[Citation]) -> List[Citation]:
+    seen, unique = set(), []
+    for citation in citations:
+        url = normalize_url(citation.url)
+        if url not in seen:
+            seen.add(url)
+            unique.append(citation)
+    return unique
+
+
+def truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    # Prefer ending on a sentence boundary if one is reasonably close
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    return (cut[:boundary + 1] if boundary > max_chars * 0.7 else cut).rstrip() + " …"
+
+
+def normalize(provider: str, raw: Any, query: Optional[str] = None, max_chars: Optional[int] = None) -> SearchResult:
+    """
+    Reduce a provider's raw (JSON) result to its answer text and de-duplicated citations.
+    Args:
+        provider (str): The provider that produced the result.
+        raw: The cached/JSON form of the provider result.
+        query (str): When given, oversized text is compressed to the sentences relevant to it.
+        max_chars (int): Hard cap on the answer text; defaults to SEARCH_RESULT_MAX_CHARS.
+    Returns:
+        SearchResult: The compact result.
+    """
+    texts, citations = [], []
+    if provider == "openai" and isinstance(raw, dict):
+        for item in raw.get("output") or []:
+            for part in item.get("content") or []:
+                if part.get("type") != "output_text":
+                    continue
+                texts.append(part.get("text", ""))
+                for annotation in part.get("annotations") or []:
+                    if annotation.get("url"):
+                        citations.append(Citation(title=annotation.get("title"), url=annotation["url"]))
+    elif provider == "exa" and isinstance(raw, dict):
+        texts.append(raw.get("content") or "")
+        for citation in raw.get("citations") or []:
+            if isinstance(citation, dict) and citation.get("url"):
+                citations.append(Citation(title=citation.get("title"), url=citation["url"]))
+            elif isinstance(citation, str) and citation.startswith("http"):
+                citations.append(Citation(url=citation))
+    elif isinstance(raw, str):
+        texts.append(raw)
+    full_text = "\n\n".join(t.strip() for t in texts if t and t.strip())
+    text = compress(full_text, query) if query else full_text
+    max_chars = max_chars or MAX_CHARS
+    return SearchResult(
+        provider=provider,
+        text=truncate(text, max_chars),
+        citations=dedupe_citations(citations),
+        truncated=text != full_text or len(text) > max_chars,
+    )
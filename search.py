@@ -0,0 +1,159 @@
+import json
+import time
+import asyncio
+import logging
+from typing import Any
+
+from providers import SEARCH_PROVIDERS, ASYNC_SEARCH_PROVIDERS, SEARCH_RATE_LIMIT_KEYS
+from search_cache import search_cache, normalize_query
+from semantic_cache import semantic_cache
+from hedging import hedged, ahedged, latency
+from health import health, HALF_OPEN
+from results import SearchResult, normalize
+from rate_limit import limiters
+from compression import estimate_tokens
+from singleflight import search_flights
+
+logger = logging.getLogger(__name__)
+
+
+def to_jsonable(result: Any) -> Any:
+    # OpenAI SDK responses are pydantic models; dicts and strings pass through
+    if hasattr(result, "model_dump"):
+        return result.model_dump(mode="json")
+    return result
+
+
+def search(provider: str, query: str, fallback: bool = True) -> SearchResult:
+    """
+    Run a query against a search provider, serving repeats from the persistent cache
+    and near-duplicate phrasings from the semantic cache. Slow calls are hedged with
+    a secondary engine, and unhealthy providers are routed around. Concurrent identical
+    queries share a single in-flight provider call.
+    Args:
+        provider (str): One of the keys of providers.SEARCH_PROVIDERS.
+        query (str): The query to search for.
+        fallback (bool): Whether another engine may stand in for a slow, failing or open-circuit provider.
+    Returns:
+        SearchResult: The compact answer text and citations from whichever engine answered.
+    """
+    cached = search_cache.get(provider, query)
+    if cached is not None:
+        logger.info(f"Search cache hit for {provider}: {query}")
+        return normalize(provider, cached, query)
+    cached = semantic_cache.get(provider, query)
+    if cached is not None:
+        return normalize(provider, cached, query)
+    return search_flights.do(_flight_key(provider, query, fallback), lambda: _search_uncached(provider, query, fallback))
+
+
+def _search_uncached(provider: str, query: str, fallback: bool) -> SearchResult:
+    if not fallback:
+        return normalize(provider, _fetch(provider, query), query)
+    route = health.route(provider, list(SEARCH_PROVIDERS))
+    try:
+        answered_by, result = hedged(route, query, _fetch)
+    except Exception as e:
+        answered_by = health.alternative(route, list(SEARCH_PROVIDERS))
+        if answered_by is None:
+            raise
+        logger.warning(f"{route} search failed ({str(e)}), retrying with {answered_by}")
+        result = _fetch(answered_by, query)
+    return normalize(answered_by, result, query)
+
+
+async def asearch(provider: str, query: str, fallback: bool = True) -> SearchResult:
+    """
+    Async counterpart of search(); provider calls never block the event loop.
+    Args:
+        provider (str): One of the keys of providers.ASYNC_SEARCH_PROVIDERS.
+        query (str): The query to search for.
+        fallback (bool): Whether another engine may stand in for a slow, failing or open-circuit provider.
+    Returns:
+        SearchResult: The compact answer text and citations from whichever engine answered.
+    """
+    # SQLite lookups are local but may wait on a writer's lock, so keep them off the loop
+    cached = await asyncio.to_thread(search_cache.get, provider, query)
+    if cached is not None:
+        logger.info(f"Search cache hit for {provider}: {query}")
+        return normalize(provider, cached, query)
+    cached = await asyncio.to_thread(semantic_cache.get, provider, query)
+    if cached is not None:
+        return normalize(provider, cached, query)
+    return await search_flights.ado(_flight_key(provider, query, fallback), lambda: _asearch_uncached(provider, query, fallback))
+
+
+async def _asearch_uncached(provider: str, query: str, fallback: bool) -> SearchResult:
+    if not fallback:
+        return normalize(provider, await _afetch(provider, query), query)
+    route = health.route(provider, list(ASYNC_SEARCH_PROVIDERS))
+    try:
+        answered_by, result = await ahedged(route, query, _afetch)
+    except Exception as e:
+        answered_by = health.alternative(route, list(ASYNC_SEARCH_PROVIDERS))
+        if answered_by is None:
+            raise
+        logger.warning(f"{route} search failed ({str(e)}), retrying with {answered_by}")
+        result = await _afetch(answered_by, query)
+    return normalize(answered_by, result, query)
+
+
+def _flight_key(provider: str, query: str, fallback: bool) -> str:
+    return f"{provider}\x00{fallback}\x00{normalize_query(query)}"
+
+
+def _fetch(provider: str, query: str) -> Any:
+    admitted = health[provider].claim()
+    limiter = limiters[SEARCH_RATE_LIMIT_KEYS[provider]]
+    limiter.acquire()
+    started = time.monotonic()
+    try:
+        result = to_jsonable(SEARCH_PROVIDERS[provider](query))
+    except Exception:
+        health[provider].record_failure()
+        raise
+    except BaseException:
+        if admitted == HALF_OPEN:
+            health[provider].record_cancelled()
+        raise
+    elapsed = time.monotonic() - started
+    latency.record(provider, elapsed)
+    health[provider].record_success(elapsed)
+    limiter.record_tokens(_usage_tokens(query, result))
+    _store(provider, query, result)
+    return result
+
+
+async def _afetch(provider: str, query: str) -> Any:
+    admitted = health[provider].claim()
+    limiter = limiters[SEARCH_RATE_LIMIT_KEYS[provider]]
+    try:
+        await limiter.aacquire()
+        started = time.monotonic()
+        result = to_jsonable(await ASYNC_SEARCH_PROVIDERS[provider](query))
+    except asyncio.CancelledError:
+        if admitted == HALF_OPEN:
+            health[provider].record_cancelled()
+        raise
+    except Exception:
+        health[provider].record_failure()
+        raise
+    elapsed = time.monotonic() - started
+    latency.record(provider, elapsed)
+    health[provider].record_success(elapsed)
+    limiter.record_tokens(_usage_tokens(query, result))
+    await asyncio.to_thread(_store, provider, query, result)
+    return result
+
+
+def _usage_tokens(query: str, result: Any) -> int:
+    # OpenAI reports usage; for the other engines estimate it from the payload size
+    usage = result.get("usage") if isinstance(result, dict) else None
+    if isinstance(usage, dict) and usage.get("total_tokens"):
+        return usage["total_tokens"]
+    return estimate_tokens(query) + estimate_tokens(json.dumps(result, default=str))
+
+
+def _store(provider: str, query: str, result: Any) -> None:
+    search_cache.set(provider, query, result)
+    semantic_cache.add(provider, query)
@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+from metrics import metrics
+from sqlite_store import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+
+DEFAULT_TTLS: Dict[str, float] = {
+    "openai": 7 * DAY,
+    "exa": 7 * DAY,
+    "duckduckgo": 1 * DAY,
+}
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query so trivially different phrasings share a cache entry.
+    Args:
+        query (str): The raw query.
+    Returns:
+        str: Lower-cased query with collapsed whitespace and no trailing punctuation.
+    """
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?.!")
+
+
+def cache_key(provider: str, query: str) -> str:
+    return hashlib.sha256(f"{provider}\x00{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+
+class SearchCache(SqliteStore):
+    """
+    Persistent SQLite cache for search tool results.
+    Entries are keyed by provider plus normalized query, expire after a per-provider TTL
+    and are evicted least-recently-used once the stored payload exceeds max_bytes.
+    The database runs in WAL mode so several uvicorn workers can share one file.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttls: Dict[str, float]):
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        super().__init__(path, [
+            """
+            CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                query TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_search_cache_lru ON search_cache (last_access)",
+        ])
+
+    def get(self, provider: str, query: str, record: bool = True) -> Optional[Any]:
+        """
+        Look up a cached result.
+        Args:
+            provider (str): The search provider name.
+            query (str): The search query.
+            record (bool): Whether to count the lookup in the hit/miss metrics.
+        Returns:
+            The cached result, or None on a miss or expired entry.
+        """
+        key = cache_key(provider, query)
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute("SELECT value, expires_at FROM search_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < now:
+            if row is not None:
+                conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+            if record:
+                metrics.incr(f"search_cache.{provider}.misses")
+            return None
+        conn.execute("UPDATE search_cache SET last_access = ? WHERE key = ?", (now, key))
+        if record:
+            metrics.incr(f"search_cache.{provider}.hits")
+        return json.loads(row[0])
+
+    def contains(self, provider: str, query: str) -> bool:
+        # Unlike get(), this neither counts as a hit/miss nor refreshes the LRU position
+        row = self._connect().execute(
+            "SELECT 1 FROM search_cache WHERE key = ? AND expires_at >= ?", (cache_key(provider, query), time.time())
+        ).fetchone()
+        return row is not None
+
+    def set(self, provider: str, query: str, value: Any) -> None:
+        payload = json.dumps(value, default=str)
+        now = time.time()
+        ttl = self.ttls.get(provider, DAY)
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (cache_key(provider, query), provider, normalize_query(query), payload, len(payload), now, now + ttl, now),
+        )
+        self._evict("search_cache", self.max_bytes, expires_column="expires_at")
+
+    def stats(self) -> Dict[str, float]:
+        conn = self._connect()
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM search_cache").fetchone()
+        return {"entries": entries, "bytes": size, **metrics.snapshot("search_cache.")}
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM search_cache")
+
+
+search_cache = SearchCache(
+    path=os.environ.get("SEARCH_CACHE_PATH", ".cache/search_cache.sqlite"),
+    max_bytes=int(os.environ.get("SEARCH_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+    ttls={
+        provider: float(os.environ.get(f"SEARCH_CACHE_TTL_{provider.upper()}", ttl))
+        for provider, ttl in DEFAULT_TTLS.items()
+    },
+)
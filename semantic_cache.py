@@ -0,0 +1,261 @@
+import os
+import re
+import time
+import zlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import metrics
+from sqlite_store import SqliteStore
+from search_cache import search_cache, normalize_query
+
+logger = logging.getLogger(__name__)
+
+# How often each process drops index entries whose search cache entry has expired or been evicted
+PRUNE_INTERVAL = float(os.environ.get("SEMANTIC_CACHE_PRUNE_INTERVAL", "3600"))
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "is", "are", "what", "which",
+    "how", "much", "many", "by", "from", "with", "at", "as", "do", "does", "typical", "typically",
+}
+
+# Domain synonyms that agents use interchangeably in search queries. Only exact equivalents:
+# folding words that merely overlap ("solid", "waste") would make different questions collide
+SYNONYMS = {
+    "percentage": "%", "percent": "%", "share": "%", "proportion": "%", "fraction": "%", "content": "%",
+}
+# Spelled-out forms of the acronyms agents also search by
+PHRASES = {"municipal solid waste": "msw", "refuse derived fuel": "rdf", "solid recovered fuel": "srf"}
+
+# Words that flip a question's direction; two queries only match if they ask the same way
+DIRECTIONS = {
+    "increase": "up", "increasing": "up", "increased": "up", "higher": "up", "more": "up", "rise": "up",
+    "raise": "up", "gain": "up", "improve": "up", "maximize": "up", "maximum": "up", "max": "up",
+    "decrease": "down", "decreasing": "down", "decreased": "down", "lower": "down", "less": "down",
+    "fewer": "down", "reduce": "down", "reduced": "down", "reducing": "down", "reduction": "down",
+    "drop": "down", "fall": "down", "decline": "down", "minimize": "down", "minimum": "down", "min": "down",
+}
+
+# Places matched in any case, so a lowercase "mumbai" is as much an anchor as "Mumbai";
+# extend with SEMANTIC_CACHE_PLACES (comma-separated) and the deployment's DEFAULT_PLACE
+PLACES = {
+    "india", "mumbai", "navi mumbai", "thane", "delhi", "new delhi", "noida", "gurugram", "gurgaon",
+    "bengaluru", "bangalore", "chennai", "kolkata", "hyderabad", "pune", "ahmedabad", "surat",
+    "jaipur", "lucknow", "kanpur", "nagpur", "indore", "bhopal", "patna", "vadodara", "nashik",
+    "visakhapatnam", "coimbatore", "kochi", "chandigarh", "goa", "maharashtra", "karnataka",
+    "tamil nadu", "kerala", "gujarat", "rajasthan", "uttar pradesh", "west bengal", "telangana",
+}
+PLACES |= {
+    normalize_query(place)
+    for place in os.environ.get("SEMANTIC_CACHE_PLACES", "").split(",") + [os.environ.get("DEFAULT_PLACE", "")]
+    if place.strip()
+}
+# Longest names first, so "navi mumbai" is not read as "mumbai"
+PLACE_PATTERN = re.compile(r"\b(" + "|".join(re.escape(p) for p in sorted(PLACES, key=len, reverse=True)) + r")\b")
+
+# "non-ferrous", "not recyclable", "without PVC": the negation is fused onto the word it negates
+NEGATION_PATTERN = re.compile(r"\b(non|not|no|without)[\s-]+(?:(?:a|an|the|any)\s+)?(?=[a-z0-9])", re.IGNORECASE)
+
+
+def _fold_negations(query: str) -> str:
+    # Keeps the case of the negation, so "Non-PVC" stays a capitalized word
+    return NEGATION_PATTERN.sub(lambda m: ("N" if m.group(1)[0].isupper() else "n") + "on", query)
+
+
+def _tokens(query: str) -> List[str]:
+    text = normalize_query(_fold_negations(query))
+    for phrase, acronym in PHRASES.items():
+        text = re.sub(rf"\b{phrase}\b", acronym, text)
+    words = re.findall(r"[a-z0-9%]+|%", text)
+    # Crude plural folding so "plastics" and "plastic" share features
+    words = [w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words if w not in STOPWORDS]
+    tokens = [SYNONYMS.get(w, w) for w in words]
+    return list(dict.fromkeys(tokens))
+
+
+def _anchors(query: str) -> Tuple[frozenset, frozenset, frozenset, frozenset, frozenset]:
+    """
+    Tokens that must agree for two queries to be treated as the same question: numbers;
+    every capitalized or all-caps word, wherever it appears (place names, acronyms such
+    as PVC or PET, and sentence-case first words, which may be either); known places in
+    any case; negated words ("non-ferrous"); and the direction the query asks about.
+    """
+    numbers = frozenset(re.findall(r"\d+(?:\.\d+)?", query))
+    folded = _fold_negations(query)
+    words = [w for w in re.findall(r"[A-Za-z]+", folded) if w[0].isupper()]
+    tokens = _tokens(query)
+    places = frozenset(PLACE_PATTERN.findall(normalize_query(query)))
+    negated = frozenset(t for t in tokens if t.startswith("non") and len(t) > 3)
+    directions = frozenset(DIRECTIONS[t] for t in tokens if t in DIRECTIONS)
+    return numbers, frozenset(_tokens(" ".join(words))), places, negated, directions
+
+
+def _same_question(query: str, other: str) -> bool:
+    # Capitalized words only have to appear in the other query, in any case or synonym
+    # ("MSW" and "municipal solid waste"), so a place may lead one query and trail the other;
+    # numbers, places, negations and directions must match exactly
+    numbers, proper, *exact = _anchors(query)
+    other_numbers, other_proper, *other_exact = _anchors(other)
+    return (
+        numbers == other_numbers
+        and exact == other_exact
+        and proper <= set(_tokens(other))
+        and other_proper <= set(_tokens(query))
+    )
+
+
+def embed(query: str, dim: int) -> np.ndarray:
+    """
+    Embed a query as an L2-normalized hashed bag of word unigrams and character trigrams.
+    Args:
+        query (str): The query to embed.
+        dim (int): Vector dimension.
+    Returns:
+        np.ndarray: float32 vector of shape (dim,).
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in _tokens(query):
+        features = [f"w:{word}"] + [f"c:{g}" for g in (f"<{word}>"[i:i + 3] for i in range(len(word)))]
+        weight = 1.0 / len(features)
+        vector[zlib.crc32(features[0].encode()) % dim] += 1.0
+        for feature in features[1:]:
+            vector[zlib.crc32(feature.encode()) % dim] += weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache(SqliteStore):
+    """
+    Near-duplicate query tier underneath the exact-match search cache.
+    Every cached query is embedded locally and kept in an in-memory float32 matrix per
+    process. Vectors are persisted in the search cache database, so other workers pick
+    up new entries incrementally, and entries are pruned once their search cache entry
+    expires or is evicted. A lookup returns the exact-cache entry of the most
+    similar previously seen query when the cosine similarity clears the threshold.
+    """
+
+    def __init__(self, path: str, dim: int, threshold: float):
+        self.dim = dim
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._providers: List[str] = []
+        self._queries: List[str] = []
+        self._last_id = 0
+        self._pruned_at = time.monotonic()
+        super().__init__(path, [
+            """
+            CREATE TABLE IF NOT EXISTS semantic_index (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                provider TEXT NOT NULL,
+                query TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                UNIQUE (provider, query)
+            )
+            """,
+        ])
+
+    def _refresh(self) -> None:
+        rows = self._connect().execute(
+            "SELECT id, provider, query, vector FROM semantic_index WHERE id > ? ORDER BY id", (self._last_id,)
+        ).fetchall()
+        if not rows:
+            return
+        with self._lock:
+            rows = [row for row in rows if row[0] > self._last_id]
+            if not rows:
+                return
+            self._load(rows, append=True)
+
+    def _load(self, rows: List[Tuple], append: bool = False) -> None:
+        # Caller holds self._lock
+        new = np.frombuffer(b"".join(row[3] for row in rows), dtype=np.float32).reshape(-1, self.dim)
+        self._vectors = np.vstack([self._vectors, new]) if append else new
+        self._providers = (self._providers if append else []) + [row[1] for row in rows]
+        self._queries = (self._queries if append else []) + [row[2] for row in rows]
+        self._last_id = rows[-1][0] if rows else (self._last_id if append else 0)
+
+    def nearest(self, provider: str, query: str) -> Optional[Tuple[str, float]]:
+        """
+        Find the most similar indexed query for a provider.
+        Args:
+            provider (str): The search provider name.
+            query (str): The query to match.
+        Returns:
+            Optional[Tuple[str, float]]: The matched normalized query and its similarity, if above threshold.
+        """
+        self._refresh()
+        with self._lock:
+            vectors, providers, queries = self._vectors, self._providers, self._queries
+        if not len(queries):
+            return None
+        # Only this provider's entries compete, so other providers' near-duplicates can't crowd them out
+        candidates = np.flatnonzero(np.asarray(providers) == provider)
+        if not len(candidates):
+            return None
+        scores = vectors[candidates] @ embed(query, self.dim)
+        for position in np.argsort(scores)[::-1][:5]:
+            score = float(scores[position])
+            if score < self.threshold:
+                break
+            index = candidates[position]
+            if _same_question(query, queries[index]):
+                return queries[index], score
+        return None
+
+    def get(self, provider: str, query: str) -> Optional[Any]:
+        match = self.nearest(provider, query)
+        result = search_cache.get(provider, match[0], record=False) if match else None
+        if result is None:
+            metrics.incr(f"semantic_cache.{provider}.misses")
+            return None
+        metrics.incr(f"semantic_cache.{provider}.hits")
+        metrics.incr("semantic_cache.avoided_provider_calls")
+        logger.info(f"Semantic cache matched '{query}' to '{match[0]}' (similarity {match[1]:.2f})")
+        return result
+
+    def add(self, provider: str, query: str) -> None:
+        # The original casing is kept so anchor checks can see proper nouns
+        self._connect().execute(
+            "INSERT OR IGNORE INTO semantic_index (provider, query, vector) VALUES (?, ?, ?)",
+            (provider, re.sub(r"\s+", " ", query).strip(), embed(query, self.dim).tobytes()),
+        )
+        with self._lock:
+            due = time.monotonic() - self._pruned_at > PRUNE_INTERVAL
+            if due:
+                self._pruned_at = time.monotonic()
+        if due:
+            self.prune()
+
+    def prune(self) -> int:
+        """
+        Drop indexed queries whose search cache entry has expired or been evicted, so the index
+        follows the search cache's TTL and LRU bounds, then reload the in-memory matrix.
+        Returns:
+            int: The number of entries dropped.
+        """
+        conn = self._connect()
+        rows = conn.execute("SELECT id, provider, query FROM semantic_index").fetchall()
+        stale = [(id_,) for id_, provider, query in rows if not search_cache.contains(provider, query)]
+        if stale:
+            conn.executemany("DELETE FROM semantic_index WHERE id = ?", stale)
+        with self._lock:
+            # Rebuilt under the lock so a concurrent _refresh can't append rows fetched before the prune
+            self._load(conn.execute("SELECT id, provider, query, vector FROM semantic_index ORDER BY id").fetchall())
+            self._pruned_at = time.monotonic()
+        metrics.incr("semantic_cache.pruned", len(stale))
+        logger.info(f"Semantic cache pruned {len(stale)} of {len(rows)} entries")
+        return len(stale)
+
+    def stats(self) -> Dict[str, float]:
+        return {"entries": len(self._queries), **metrics.snapshot("semantic_cache.")}
+
+
+semantic_cache = SemanticCache(
+    path=search_cache.path,
+    dim=int(os.environ.get("SEMANTIC_CACHE_DIM", "512")),
+    threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.85")),
+)
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderCancelled(Exception):
+    """
+    Set on a call whose leader was cancelled, so the callers waiting on it retry instead of failing.
+    """
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls so only one of them does the work.
+    The first caller for a key runs the function; callers arriving while it is in flight,
+    from any thread or asyncio task, wait for and share its result or exception.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                metrics.incr(f"singleflight.{self.name}.coalesced")
+                return future, False
+            future = Future()
+            # A running future can't be cancelled, so a waiter that gives up never cancels it for the others
+            future.set_running_or_notify_cancel()
+            self._calls[key] = future
+            return future, True
+
+    def _settle(self, key: str, future: Future, result: Any = None, exception: BaseException = None) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn() once per in-flight key.
+        Args:
+            key (str): Identity of the call.
+            fn (Callable): The work to perform.
+        Returns:
+            The shared result of fn().
+        """
+        future, leader = self._claim(key)
+        if not leader:
+            try:
+                return future.result()
+            except LeaderCancelled:
+                # The leader was cancelled, not us; do the work ourselves
+                return self.do(key, fn)
+        try:
+            result = fn()
+        except BaseException as e:
+            self._settle(key, future, exception=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async counterpart of do(); shares in-flight calls with threads as well as tasks.
+        """
+        future, leader = self._claim(key)
+        if not leader:
+            try:
+                # Shielded: cancelling this caller must not cancel the call the others share
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except LeaderCancelled:
+                return await self.ado(key, fn)
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self._settle(key, future, exception=LeaderCancelled(f"{self.name} call {key!r} was cancelled"))
+            raise
+        except BaseException as e:
+            self._settle(key, future, exception=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+
+search_flights = SingleFlight("search")
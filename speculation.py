@@ -0,0 +1,170 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from metrics import metrics
+from search import asearch
+from search_cache import search_cache, normalize_query
+from semantic_cache import semantic_cache
+from meta_search import META_SEARCH_PROVIDERS
+from research import stage_queries
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: every stage speculates all its standard queries against every meta-search provider,
+# whether or not its agent then asks for them, so a run typically makes about three times the
+# provider calls (and spends that much more search quota) for a shorter wall-clock time.
+# Watch speculation.used_calls against speculation.calls on /metrics before turning it on.
+SPECULATION_ENABLED = os.environ.get("SPECULATIVE_PREFETCH", "0") == "1"
+
+# A speculated search: (provider, normalized query) -> (its task, when it started)
+Speculated = Dict[Tuple[str, str], Tuple[asyncio.Task, float]]
+
+
+class SpeculativePrefetch(AsyncCallbackHandler):
+    """
+    Per-run hook that starts the likely next stage's standard research searches in the
+    background as soon as a stage begins, so they land in the search cache (or are still in
+    flight, where the agent's identical search joins them) by the time that stage needs them.
+    The next stage is predicted from the stage order. When a different stage starts instead,
+    or the run ends first, the speculative searches still in flight are cancelled.
+    Latency saved is only credited for searches the stage's agent actually issued, word for word
+    or as a rephrasing the semantic cache answers from a prefetched result; prefetched results
+    it never asked for count as waste. See SPECULATION_ENABLED for the cost.
+    """
+
+    def __init__(
+        self,
+        place: str,
+        stages: Sequence[str],
+        tool_providers: Dict[str, List[str]],
+        providers: Optional[List[str]] = None,
+    ):
+        """
+        Args:
+            place (str): The place the research queries are about.
+            stages (Sequence[str]): The run's stages in process order.
+            tool_providers (Dict[str, List[str]]): Search tool name to the providers it queries.
+            providers (List[str]): Search providers to prefetch from; defaults to the meta-search ones.
+        """
+        self.place = place
+        self.stages = list(stages)
+        self.tool_providers = tool_providers
+        self.providers = providers or META_SEARCH_PROVIDERS
+        self.current: Optional[str] = None
+        self.predicted: Optional[str] = None
+        # Searches speculated for the predicted stage, and those of the running stage not read yet
+        self.pending: Speculated = {}
+        self.active: Speculated = {}
+        self.report = {
+            "confirmed": 0, "mispredicted": 0, "calls": 0, "used_calls": 0, "wasted_calls": 0, "cancelled_calls": 0,
+            "head_start_seconds": 0.0,
+        }
+
+    async def on_chain_start(self, serialized: Optional[Dict[str, Any]], inputs: Dict[str, Any], **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        # Stage nodes and the agents inside them share a name; react once per stage
+        if name not in self.stages or name == self.current:
+            return
+        self._retire()
+        self.current = name
+        if self.predicted:
+            self._settle(confirmed=name == self.predicted)
+        position = self.stages.index(name)
+        self.predicted = self.stages[position + 1] if position + 1 < len(self.stages) else None
+        if self.predicted:
+            self._launch(self.predicted)
+
+    async def on_tool_start(
+        self, serialized: Optional[Dict[str, Any]], input_str: str, *, inputs: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        query = (inputs or {}).get("query") or input_str
+        for provider in self.tool_providers.get(name, []):
+            entry = self.active.pop((provider, normalize_query(query)), None)
+            if entry is None and any(speculated == provider for speculated, _ in self.active):
+                # A rephrased query is served from a prefetched result by the semantic cache
+                match = await asyncio.to_thread(semantic_cache.nearest, provider, query)
+                if match is not None:
+                    entry = self.active.pop((provider, normalize_query(match[0])), None)
+            if entry is not None:
+                self._credit(*entry)
+
+    def _launch(self, stage: str) -> None:
+        for query in stage_queries(self.place, [stage]).get(stage, []):
+            for provider in self.providers:
+                if search_cache.contains(provider, query):
+                    continue
+                task = asyncio.create_task(self._fetch(provider, query))
+                self.pending[(provider, normalize_query(query))] = (task, time.monotonic())
+                self.report["calls"] += 1
+                metrics.incr("speculation.calls")
+
+    async def _fetch(self, provider: str, query: str) -> Optional[float]:
+        started = time.monotonic()
+        try:
+            await asearch(provider, query, fallback=False)
+        except Exception as e:
+            logger.info(f"Speculative {provider} search failed for '{query}': {str(e)}")
+            metrics.incr("speculation.failed_calls")
+            return None
+        return time.monotonic() - started
+
+    def _credit(self, task: asyncio.Task, started: float) -> None:
+        # The stage asked for a speculated search: the work done (or under way) before it asked is saved
+        if not task.done():
+            head_start = time.monotonic() - started
+        elif task.cancelled() or task.result() is None:
+            head_start = 0.0
+        else:
+            head_start = task.result()
+        self.report["used_calls"] += 1
+        self.report["head_start_seconds"] += head_start
+        metrics.incr("speculation.used_calls")
+        metrics.incr("speculation.head_start_seconds", head_start)
+
+    def _discard(self, speculated: Speculated) -> None:
+        for task, _ in speculated.values():
+            if task.done():
+                self.report["wasted_calls"] += 1
+                metrics.incr("speculation.wasted_calls")
+            else:
+                task.cancel()
+                self.report["cancelled_calls"] += 1
+                metrics.incr("speculation.cancelled_calls")
+
+    def _retire(self) -> None:
+        # The running stage is over; whatever it didn't read was speculated for nothing
+        self._discard(self.active)
+        self.active = {}
+
+    def _settle(self, confirmed: bool) -> None:
+        if confirmed:
+            self.active = self.pending
+        else:
+            self._discard(self.pending)
+        outcome = "confirmed" if confirmed else "mispredicted"
+        self.report[outcome] += 1
+        metrics.incr(f"speculation.{outcome}_stages")
+        self.pending = {}
+
+    def close(self) -> Dict[str, float]:
+        """
+        End the run: speculation never read, or for a stage that never started, is cancelled and counted as waste.
+        Returns:
+            Dict[str, float]: This run's confirmed/mispredicted stages, calls, used/wasted/cancelled calls and head start.
+        """
+        self._retire()
+        if self.predicted and self.pending:
+            self._settle(confirmed=False)
+        self.predicted = None
+        logger.info(f"Speculative prefetch for {self.place}: {self.report}")
+        return self.report
+
+
+def speculation_stats() -> Dict[str, float]:
+    return metrics.snapshot("speculation.")
@@ -0,0 +1,77 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional, Sequence
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteStore:
+    """
+    Base for the on-disk caches and stores: one SQLite file in WAL mode, so several uvicorn
+    workers can share it, opened once per thread in autocommit mode. Stores whose rows carry
+    `size` and `last_access` columns can bound themselves with _evict.
+    """
+
+    def __init__(self, path: str, schema: Sequence[str]):
+        """
+        Args:
+            path (str): The database file; its directory is created if missing.
+            schema (Sequence[str]): CREATE TABLE / CREATE INDEX IF NOT EXISTS statements to run.
+        """
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        for statement in schema:
+            conn.execute(statement)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _evict(self, table: str, max_bytes: int, expires_column: Optional[str] = None) -> int:
+        """
+        Delete least-recently-used rows of a table until its payload fits in max_bytes.
+        Args:
+            table (str): The table, keyed by `key` with `size` and `last_access` columns; also the metrics prefix.
+            max_bytes (int): The payload budget.
+            expires_column (str): Column holding an expiry time; expired rows go first.
+        Returns:
+            int: The number of rows evicted by LRU (expired rows not counted).
+        """
+        conn = self._connect()
+        total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+        if total <= max_bytes:
+            return 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if expires_column:
+                conn.execute(f"DELETE FROM {table} WHERE {expires_column} < ?", (time.time(),))
+            rows = conn.execute(f"SELECT key, size FROM {table} ORDER BY last_access").fetchall()
+            total = sum(size for _, size in rows)
+            evicted = 0
+            for key, size in rows:
+                if total <= max_bytes:
+                    break
+                conn.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        metrics.incr(f"{table}.evictions", evicted)
+        logger.info(f"{table} evicted {evicted} entries")
+        return evicted
@@ -0,0 +1,83 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+from metrics import metrics
+from sqlite_store import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+STAGE_MEMO_ENABLED = os.environ.get("STAGE_MEMO", "1") == "1"
+
+
+def memo_key(stage: str, inputs: Dict[str, Any]) -> str:
+    """
+    Content address of a stage run.
+    Args:
+        stage (str): The stage name.
+        inputs (Dict[str, Any]): Everything the stage output depends on (JSON-serializable).
+    Returns:
+        str: A sha256 hex digest.
+    """
+    payload = json.dumps({"stage": stage, **inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StageMemo(SqliteStore):
+    """
+    Disk store of pipeline stage outputs keyed by a hash of each stage's inputs, so a run
+    reuses every stage whose input composition, parameters, model and prompt are unchanged.
+    LRU-evicted above max_bytes, like the search and LLM caches.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(path, [
+            """
+            CREATE TABLE IF NOT EXISTS stage_memo (
+                key TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_stage_memo_lru ON stage_memo (last_access)",
+        ])
+
+    def get(self, stage: str, key: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM stage_memo WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            metrics.incr(f"stage_memo.{stage}.misses")
+            return None
+        conn.execute("UPDATE stage_memo SET last_access = ? WHERE key = ?", (time.time(), key))
+        metrics.incr(f"stage_memo.{stage}.hits")
+        logger.info(f"Reusing memoized output of stage {stage}")
+        return json.loads(row[0])
+
+    def set(self, stage: str, key: str, value: Dict[str, Any]) -> None:
+        payload = json.dumps(value)
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO stage_memo VALUES (?, ?, ?, ?, ?)",
+            (key, stage, payload, len(payload), time.time()),
+        )
+        self._evict("stage_memo", self.max_bytes)
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM stage_memo")
+
+    def stats(self) -> Dict[str, float]:
+        conn = self._connect()
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM stage_memo").fetchone()
+        return {"entries": entries, "bytes": size, **metrics.snapshot("stage_memo.")}
+
+
+stage_memo = StageMemo(
+    path=os.environ.get("STAGE_MEMO_PATH", ".cache/stage_memo.sqlite"),
+    max_bytes=int(os.environ.get("STAGE_MEMO_MAX_BYTES", str(128 * 1024 * 1024))),
+) if STAGE_MEMO_ENABLED else None
@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+from metrics import metrics
+from sqlite_store import SqliteStore
+from workflow_state import FuelComposition
+
+logger = logging.getLogger(__name__)
+
+TARGETS = list(FuelComposition.model_fields)
+R4_FEATURES = ["r4_negative_pressure", "r4_temperature", "r4_retention_time"]
+# Runs report fuel properties after R4 or after the water bath; the model learns one of them
+TARGET_STAGE = os.environ.get("SURROGATE_TARGET_STAGE", "water_bath_process_engineer")
+RIDGE_ALPHA = float(os.environ.get("SURROGATE_RIDGE_ALPHA", "1.0"))
+# Distinct (composition, R4 parameters) samples needed, and residual degrees of freedom beyond the features
+MIN_SAMPLES = int(os.environ.get("SURROGATE_MIN_SAMPLES", "20"))
+MIN_DOF = int(os.environ.get("SURROGATE_MIN_DOF", "5"))
+# A prediction is trusted when every property's predictive std is within this share of its spread in the data
+MAX_STD_RATIO = float(os.environ.get("SURROGATE_MAX_STD_RATIO", "0.25"))
+# Residual noise is never taken as below this share of a property's spread, however well the model fits
+NOISE_FLOOR = float(os.environ.get("SURROGATE_NOISE_FLOOR", "0.05"))
+# Inputs further than this share of a feature's training range outside that range are extrapolation
+RANGE_MARGIN = float(os.environ.get("SURROGATE_RANGE_MARGIN", "0.1"))
+
+
+class SurrogatePrediction(BaseModel):
+    # No properties or std when there is too little data to fit the model at all
+    properties: Optional[FuelComposition] = None
+    std: Dict[str, float] = {}
+    confident: bool
+    insufficient_data: bool = False
+    samples: int
+    reason: Optional[str] = None
+
+
+class FuelPropertySurrogate(SqliteStore):
+    """
+    Ridge regression from (RDF composition, R4 parameters) to the five fuel properties,
+    trained on the results of completed pipeline runs. Predictions come with a per-property
+    standard deviation from the Bayesian reading of ridge (noise variance times
+    1 + x' (X'X + aI)^-1 x), so callers can fall back to the agents when it is too wide.
+    Samples are kept in SQLite, one per distinct composition and R4 settings (a repeat run
+    replaces the earlier result), and only TARGET_STAGE results are trained on. The model
+    is refit lazily after new samples arrive.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._model = None
+        self._dirty = True
+        super().__init__(path, [
+            """
+            CREATE TABLE IF NOT EXISTS surrogate_samples (
+                key TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                composition TEXT NOT NULL,
+                parameters TEXT NOT NULL,
+                properties TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """,
+        ])
+
+    def log(
+        self, composition: Dict[str, float], parameters: Dict[str, float], properties: FuelComposition, stage: str
+    ) -> None:
+        """
+        Record one completed run as a training sample.
+        Args:
+            composition (Dict[str, float]): RDF composition entering the R4 machine, name to percentage.
+            parameters (Dict[str, float]): The R4 parameters of the run.
+            properties (FuelComposition): The fuel properties the run produced.
+            stage (str): The stage that reported the properties.
+        """
+        # Rounded and sorted so the same inputs always produce the same key
+        features = json.dumps({_component(k): round(v, 6) for k, v in composition.items() if v}, sort_keys=True)
+        settings = json.dumps({k: round(float(parameters[k]), 6) for k in R4_FEATURES}, sort_keys=True)
+        key = hashlib.sha256(f"{stage}\x00{features}\x00{settings}".encode("utf-8")).hexdigest()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO surrogate_samples (key, stage, composition, parameters, properties, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, stage, features, settings, properties.model_dump_json(), time.time()),
+        )
+        if stage == TARGET_STAGE:
+            self._dirty = True
+        metrics.incr("surrogate.samples_logged")
+
+    def fit(self) -> None:
+        """
+        Refit the model on every logged TARGET_STAGE sample.
+        """
+        rows = self._connect().execute(
+            "SELECT composition, parameters, properties FROM surrogate_samples WHERE stage = ?", (TARGET_STAGE,)
+        ).fetchall()
+        compositions = [json.loads(r[0]) for r in rows]
+        components = sorted({name for composition in compositions for name in composition})
+        features = components + R4_FEATURES
+        X = np.array([[c.get(name, 0.0) for name in components] + [json.loads(r[1])[k] for k in R4_FEATURES]
+                      for c, r in zip(compositions, rows)]).reshape(len(rows), len(features))
+        Y = np.array([[json.loads(r[2])[t] for t in TARGETS] for r in rows]).reshape(len(rows), len(TARGETS))
+        needed = max(MIN_SAMPLES, len(features) + 1 + MIN_DOF)
+        if len(rows) < needed:
+            self._model = {"samples": len(rows), "needed": needed}
+            return
+        x_mean, x_std = X.mean(axis=0), X.std(axis=0)
+        x_std[x_std == 0] = 1.0
+        y_mean = Y.mean(axis=0)
+        Z = (X - x_mean) / x_std
+        inverse = np.linalg.inv(Z.T @ Z + RIDGE_ALPHA * np.eye(len(features)))
+        weights = inverse @ Z.T @ (Y - y_mean)
+        residuals = Y - y_mean - Z @ weights
+        # A property that never varies in the data is scaled by its magnitude instead
+        y_spread = np.maximum(np.maximum(Y.std(axis=0), 0.01 * np.abs(y_mean)), 1e-9)
+        noise = (residuals ** 2).sum(axis=0) / (len(rows) - len(features) - 1)
+        x_min, x_max = X.min(axis=0), X.max(axis=0)
+        margin = RANGE_MARGIN * (x_max - x_min)
+        self._model = {
+            "samples": len(rows),
+            "components": {name: i for i, name in enumerate(components)},
+            "features": features,
+            "x_mean": x_mean,
+            "x_std": x_std,
+            "x_low": x_min - margin,
+            "x_high": x_max + margin,
+            "y_mean": y_mean,
+            "y_spread": y_spread,
+            "weights": weights,
+            "inverse": inverse,
+            "noise": np.maximum(noise, (NOISE_FLOOR * y_spread) ** 2),
+        }
+        logger.info(f"Fitted fuel property surrogate on {len(rows)} samples, {len(features)} features")
+
+    def predict(self, composition: Dict[str, float], parameters: Dict[str, float]) -> SurrogatePrediction:
+        """
+        Predict the fuel properties for a composition and R4 settings.
+        Args:
+            composition (Dict[str, float]): RDF composition entering the R4 machine, name to percentage.
+            parameters (Dict[str, float]): The R4 parameters.
+        Returns:
+            SurrogatePrediction: Properties, their std, and whether the prediction is trustworthy (or insufficient_data).
+        """
+        with self._lock:
+            if self._dirty or self._model is None:
+                self._dirty = False
+                self.fit()
+            model = self._model
+        if "weights" not in model:
+            metrics.incr("surrogate.unconfident")
+            return SurrogatePrediction(
+                confident=False,
+                insufficient_data=True,
+                samples=model["samples"],
+                reason=f"only {model['samples']} distinct samples; need {model['needed']}",
+            )
+        columns = model["components"]
+        x = np.zeros(len(columns) + len(R4_FEATURES))
+        unseen = []
+        for name, value in composition.items():
+            column = columns.get(_component(name))
+            if column is None:
+                if value > 0:
+                    unseen.append(name)
+                continue
+            x[column] = value
+        x[len(columns):] = [float(parameters[k]) for k in R4_FEATURES]
+        z = (x - model["x_mean"]) / model["x_std"]
+        mean = model["y_mean"] + z @ model["weights"]
+        std = np.sqrt(model["noise"] * (1 + z @ model["inverse"] @ z))
+        outside = [
+            name for name, value, low, high in zip(model["features"], x, model["x_low"], model["x_high"])
+            if not low - 1e-9 <= value <= high + 1e-9
+        ]
+        reason = None
+        if unseen:
+            reason = f"components never seen in training: {unseen}"
+        elif outside:
+            reason = f"outside the training range for {outside}"
+        elif (std > MAX_STD_RATIO * model["y_spread"]).any():
+            reason = "prediction interval too wide"
+        metrics.incr("surrogate.unconfident" if reason else "surrogate.confident")
+        return SurrogatePrediction(
+            properties=FuelComposition(**dict(zip(TARGETS, mean.tolist()))),
+            std=dict(zip(TARGETS, std.tolist())),
+            confident=reason is None,
+            samples=model["samples"],
+            reason=reason,
+        )
+
+    def stats(self) -> Dict[str, float]:
+        samples = self._connect().execute(
+            "SELECT COUNT(*) FROM surrogate_samples WHERE stage = ?", (TARGET_STAGE,)
+        ).fetchone()[0]
+        return {"samples": samples, **metrics.snapshot("surrogate.")}
+
+
+def _component(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+surrogate = FuelPropertySurrogate(os.environ.get("SURROGATE_PATH", ".cache/surrogate.sqlite"))
+
+
+def predict_fuel_properties(composition: Dict[str, float], parameters: Dict[str, float]) -> SurrogatePrediction:
+    """
+    Instant fuel property estimate from the surrogate model; check `confident` before relying on it.
+    """
+    return surrogate.predict(composition, parameters)
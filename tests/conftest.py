@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# The modules live flat at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the module-level caches out of the working tree
+_cache_dir = tempfile.mkdtemp(prefix="langgraph-tests-")
+os.environ.setdefault("SEARCH_CACHE_PATH", os.path.join(_cache_dir, "search_cache.sqlite"))
+os.environ.setdefault("SURROGATE_PATH", os.path.join(_cache_dir, "surrogate.sqlite"))
+os.environ.setdefault("STAGE_MEMO_PATH", os.path.join(_cache_dir, "stage_memo.sqlite"))
+os.environ.setdefault("CHECKPOINT_PATH", os.path.join(_cache_dir, "checkpoints.sqlite"))
+os.environ.setdefault("SPECULATIVE_PREFETCH", "0")
+# The API tests replace the model calls; the client only needs a key to be built
+os.environ.setdefault("OPENAI_API_KEY", "test")
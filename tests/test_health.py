@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+import health as health_module
+import search
+from health import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, ProviderHealth
+
+
+@pytest.fixture
+def tripped(monkeypatch):
+    monkeypatch.setattr(health_module, "COOLDOWN", 0.0)
+    provider = ProviderHealth("openai")
+    provider.state, provider.opened_at = OPEN, 0.0
+    monkeypatch.setattr(search, "health", {"openai": provider})
+    return provider
+
+
+def test_only_one_probe_is_admitted(tripped):
+    assert tripped.claim() == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        tripped.claim()
+    assert not tripped.available()
+
+
+def test_successful_probe_closes(tripped):
+    tripped.claim()
+    tripped.record_success(0.1)
+    assert tripped.state == CLOSED
+
+
+def test_failed_probe_reopens(tripped):
+    tripped.claim()
+    tripped.record_failure()
+    assert tripped.state == OPEN
+
+
+def test_cancelled_probe_reopens(tripped, monkeypatch):
+    async def slow(query):
+        await asyncio.sleep(5)
+
+    monkeypatch.setitem(search.ASYNC_SEARCH_PROVIDERS, "openai", slow)
+
+    async def main():
+        probe = asyncio.create_task(search._afetch("openai", "query"))
+        await asyncio.sleep(0.01)
+        assert tripped.state == HALF_OPEN
+        # A second caller, e.g. a fallback=False prefetch, must not probe alongside it
+        with pytest.raises(CircuitOpenError):
+            await search._afetch("openai", "query")
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(main())
+    assert tripped.state == OPEN
+    assert tripped.claim() == HALF_OPEN
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+import mass_balance
+from batch_engine import BatchEngine, run_batch
+
+FEED = {"Plastic": 30.0, "Paper": 25.0, "Food waste": 20.0, "Metal": 10.0, "Glass": 10.0, "Inerts": 5.0}
+STAGES = [
+    ("bulky_removal", {"inerts": 60.0}),
+    ("magnetic_separation", {"Metal": 90.0}),
+    ("glass_separation", {"glass": 85.0, "Inerts": 20.0}),
+]
+
+
+def test_removed_plus_remaining_equals_feed():
+    balance = mass_balance.apply_removal_efficiencies(FEED, {"Metal": 90, "Glass": 50})
+    for name, feed in balance.feed.items():
+        assert balance.removed.get(name, 0.0) + balance.remaining[name] == pytest.approx(feed)
+    assert sum(balance.removed.values()) + balance.mass_yield == pytest.approx(100)
+
+
+def test_output_sums_to_100():
+    balance = mass_balance.remove_fraction(FEED, "plastic", 40)
+    assert sum(balance.composition.values()) == pytest.approx(100)
+    assert sum(mass_balance.normalize({"a": 3, "b": 7}).values()) == pytest.approx(100)
+    for _, balance in mass_balance.chain(FEED, STAGES):
+        assert sum(balance.composition.values()) == pytest.approx(100)
+
+
+def test_unseen_feed_is_normalized_first():
+    balance = mass_balance.remove_fraction({"Plastic": 3, "Paper": 1}, "Plastic", 0)
+    assert balance.feed == pytest.approx({"Plastic": 75, "Paper": 25})
+
+
+def test_category_matching_ignores_case_and_spacing():
+    balance = mass_balance.remove_fraction(FEED, "  food   WASTE ", 50)
+    assert balance.removed == pytest.approx({"Food waste": 10})
+
+
+def test_unknown_category_raises():
+    with pytest.raises(ValueError, match="Unknown category"):
+        mass_balance.remove_fraction(FEED, "Textiles", 10)
+
+
+@pytest.mark.parametrize("pct", [-1, 100.5])
+def test_out_of_range_efficiency_raises(pct):
+    with pytest.raises(ValueError, match="between 0 and 100"):
+        mass_balance.remove_fraction(FEED, "Plastic", pct)
+
+
+def test_negative_or_empty_composition_raises():
+    with pytest.raises(ValueError, match="negative"):
+        mass_balance.normalize({"Plastic": 50, "Paper": -5})
+    with pytest.raises(ValueError, match="empty"):
+        mass_balance.normalize({"Plastic": 0})
+
+
+def test_report_overall_yield_is_product_of_stage_yields():
+    balances = mass_balance.chain(FEED, STAGES)
+    overall = np.prod([b.mass_yield / 100 for _, b in balances]) * 100
+    report = mass_balance.mass_balance_report(FEED, STAGES)
+    assert f"Mass yield: {round(overall, mass_balance.PRECISION):g}% of the original feed." in report
+
+
+def test_batch_engine_matches_chain():
+    feeds = [FEED, {**dict.fromkeys(FEED, 0.0), "Plastic": 10, "Metal": 40, "Glass": 50}, {**FEED, "Inerts": 50}]
+    result = run_batch(feeds, dict(STAGES))
+    for feed, composition, mass_yield in zip(feeds, result.to_dicts(), result.mass_yield.tolist()):
+        balances = mass_balance.chain(feed, STAGES)
+        expected = balances[-1][1].composition
+        assert {k: v for k, v in composition.items() if k in expected} == pytest.approx(expected)
+        assert mass_yield == pytest.approx(np.prod([b.mass_yield / 100 for _, b in balances]) * 100)
+
+
+def test_batch_engine_stops_after_stage():
+    engine = BatchEngine(list(FEED), dict(STAGES))
+    result = engine.run(engine.to_array([FEED]), through="magnetic_separation")
+    expected = mass_balance.chain(FEED, STAGES[:2])[-1][1].composition
+    assert result.to_dicts()[0] == pytest.approx(expected)
+
+
+def test_batch_engine_validates_input():
+    with pytest.raises(ValueError, match="between 0 and 100"):
+        BatchEngine(list(FEED), {"bulky_removal": {"Inerts": 120}})
+    engine = BatchEngine(list(FEED), dict(STAGES))
+    with pytest.raises(ValueError, match="negative"):
+        engine.run(-engine.to_array([FEED]))
+    with pytest.raises(ValueError, match="Expected"):
+        engine.run(np.ones((2, 3)))
@@ -0,0 +1,13 @@
+import asyncio
+
+from providers import PROVIDER_CONFIGS, ProviderRegistry
+
+
+def test_aclose_closes_sync_and_async_pools():
+    registry = ProviderRegistry(PROVIDER_CONFIGS)
+    sync_client = registry.http_client("openai")
+    async_client = registry.async_http_client("openai")
+    asyncio.run(registry.aclose())
+    assert sync_client.is_closed and async_client.is_closed
+    # Later use gets fresh pools
+    assert not registry.async_http_client("openai").is_closed
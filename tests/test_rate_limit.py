@@ -0,0 +1,36 @@
+import asyncio
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_openai import ChatOpenAI
+from langchain_openai.chat_models.base import BaseChatOpenAI
+
+from llm_cache import LLMCache
+from rate_limit import RateLimiter, TokenBucket, TokenUsageCallback
+
+
+async def _fake_agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+    usage = {"input_tokens": 1500, "output_tokens": 500, "total_tokens": 2000}
+    return ChatResult(generations=[ChatGeneration(message=AIMessage(content="answer", usage_metadata=usage))])
+
+
+def test_token_bucket_goes_into_debt():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.take(90) > 0
+    assert bucket.wait_time(0) > 0
+
+
+def test_cache_hits_are_not_charged(tmp_path):
+    limiter = RateLimiter("test", rpm=None, tpm=100_000)
+    llm = ChatOpenAI(
+        model="gpt-4.1", api_key="test", callbacks=[TokenUsageCallback(limiter)],
+        cache=LLMCache(str(tmp_path / "llm_cache.sqlite"), max_bytes=10 ** 8), rate_limiter=limiter,
+    )
+    with patch.object(BaseChatOpenAI, "_agenerate", _fake_agenerate):
+        levels = []
+        for _ in range(3):
+            asyncio.run(llm.ainvoke("question"))
+            levels.append(limiter.tokens.level)
+    assert levels[0] <= 100_000 - 2000 + 100
+    assert levels[2] >= levels[0]
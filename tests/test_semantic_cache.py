@@ -0,0 +1,90 @@
+import pytest
+
+import semantic_cache as semantic_cache_module
+from search_cache import SearchCache
+from semantic_cache import SemanticCache, _anchors, _same_question
+
+BULKY = "{} percentage of large non-processable bulky items in municipal solid waste composition"
+
+
+@pytest.fixture
+def caches(tmp_path, monkeypatch):
+    exact = SearchCache(str(tmp_path / "cache.sqlite"), max_bytes=10 ** 9, ttls={"openai": 3600})
+    monkeypatch.setattr(semantic_cache_module, "search_cache", exact)
+    return exact, SemanticCache(exact.path, dim=512, threshold=0.85)
+
+
+def _store(exact, semantic, query, value="answer", provider="openai"):
+    exact.set(provider, query, value)
+    semantic.add(provider, query)
+
+
+def test_rephrasing_hits(caches):
+    exact, semantic = caches
+    _store(exact, semantic, "Percentage of plastics in municipal solid waste in Pune")
+    assert semantic.get("openai", "plastic share of MSW in Pune") == "answer"
+
+
+@pytest.mark.parametrize("cached, asked", [
+    (BULKY.format("Delhi"), BULKY.format("Mumbai")),
+    ("Pune share of plastic in MSW", "Nagpur share of plastic in MSW"),
+    ("PVC share of plastic waste in Pune", "PET share of plastic waste in Pune"),
+    ("HDPE recycling rate in Pune", "LDPE recycling rate in Pune"),
+])
+def test_different_anchor_misses(caches, cached, asked):
+    exact, semantic = caches
+    _store(exact, semantic, cached)
+    assert not _same_question(cached, asked)
+    assert semantic.get("openai", asked) is None
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Share of ferrous metals in MSW in Pune", "Share of non-ferrous metals in MSW in Pune"),
+    ("PVC share of plastic waste in Pune", "non-PVC share of plastic waste in Pune"),
+    ("plastic waste that is recyclable in Pune", "plastic waste that is not recyclable in Pune"),
+    (
+        "methods to increase the calorific value of refuse derived fuel pellets from plastic rich waste",
+        "methods to decrease the calorific value of refuse derived fuel pellets from plastic rich waste",
+    ),
+    (
+        "average plastic and paper share of municipal solid waste landfilled in mumbai",
+        "average plastic and paper share of municipal solid waste landfilled in delhi",
+    ),
+    ("calorific value of solid fuel", "calorific value of waste fuel"),
+])
+def test_negation_direction_and_place_misses(caches, cached, asked):
+    exact, semantic = caches
+    _store(exact, semantic, cached)
+    assert semantic.get("openai", asked) is None
+
+
+def test_other_providers_do_not_crowd_out_a_match(caches):
+    exact, semantic = caches
+    for provider in ["exa", "duckduckgo", "tavily", "serper", "bing", "brave"]:
+        _store(exact, semantic, "plastic share of MSW in Pune", provider=provider)
+    _store(exact, semantic, "current plastic share of MSW in Pune")
+    assert semantic.get("openai", "plastic share of MSW in Pune") == "answer"
+
+
+def test_anchors():
+    assert "mumbai" in _anchors(BULKY.format("Mumbai"))[1]
+    assert _anchors("What is the PVC content of RDF in Pune")[1] == frozenset({"pvc", "rdf", "pune"})
+    _, _, places, negated, directions = _anchors("how to lower the non-ferrous share of msw in navi mumbai")
+    assert places == frozenset({"navi mumbai"})
+    assert negated == frozenset({"nonferrou"})
+    assert directions == frozenset({"down"})
+
+
+def test_place_may_lead_or_trail():
+    assert _same_question("Pune share of plastic in MSW", "Plastic share of MSW in Pune")
+
+
+def test_prune_follows_search_cache(caches):
+    exact, semantic = caches
+    _store(exact, semantic, "Chlorine content of RDF in Pune")
+    _store(exact, semantic, "Moisture content of RDF in Pune")
+    exact.clear()
+    exact.set("openai", "Moisture content of RDF in Pune", "answer")
+    assert semantic.prune() == 1
+    assert semantic.stats()["entries"] == 1
+    assert semantic.get("openai", "moisture % of RDF in Pune") == "answer"
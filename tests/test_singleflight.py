@@ -0,0 +1,141 @@
+import asyncio
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_tasks_share_one_call():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flights.ado("key", work) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["result"] * 5
+    assert len(calls) == 1
+
+
+def test_cancelled_follower_does_not_affect_leader():
+    flights = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        leader = asyncio.create_task(flights.ado("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.ado("key", work))
+        other = asyncio.create_task(flights.ado("key", work))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader, await other
+
+    assert asyncio.run(main()) == ("result", "result")
+
+
+def test_cancelled_leader_hands_the_call_to_a_follower():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        leader = asyncio.create_task(flights.ado("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.ado("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "result"
+    assert len(calls) == 2
+
+
+def test_leader_exception_is_shared():
+    flights = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.02)
+        raise ValueError("provider failed")
+
+    async def main():
+        return await asyncio.gather(*(flights.ado("key", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_thread_leader_with_task_followers():
+    flights = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(flights.do("key", work)))
+    thread.start()
+    started.wait(5)
+
+    async def main():
+        followers = [asyncio.create_task(flights.ado("key", work)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        followers[0].cancel()
+        release.set()
+        return await asyncio.gather(*followers, return_exceptions=True)
+
+    outcomes = asyncio.run(main())
+    thread.join(5)
+    assert isinstance(outcomes[0], asyncio.CancelledError)
+    assert outcomes[1:] == ["result", "result"]
+    assert results == ["result"]
+    assert len(calls) == 1
+
+
+def test_task_leader_with_thread_followers_survives_leader_cancel():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def awork():
+        calls.append("async")
+        await asyncio.sleep(5)
+
+    def work():
+        calls.append("sync")
+        return "result"
+
+    results = []
+
+    async def main():
+        leader = asyncio.create_task(flights.ado("key", awork))
+        await asyncio.sleep(0.01)
+        thread = threading.Thread(target=lambda: results.append(flights.do("key", work)))
+        thread.start()
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        await asyncio.to_thread(thread.join, 5)
+
+    asyncio.run(main())
+    assert results == ["result"]
+    assert calls == ["async", "sync"]
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+import speculation
+from research import stage_queries
+from speculation import SpeculativePrefetch
+
+STAGES = ["sorting_supervisor", "sorting_engineer", "chlorine_reduction_specialist"]
+TOOLS = {"meta_search": ["openai", "exa"], "exa_search": ["exa"]}
+
+
+@pytest.fixture(autouse=True)
+def fake_search(monkeypatch):
+    async def asearch(provider, query, fallback=True):
+        await asyncio.sleep(0.05)
+
+    monkeypatch.setattr(speculation, "asearch", asearch)
+    monkeypatch.setattr(speculation.search_cache, "contains", lambda provider, query: False)
+    monkeypatch.setattr(speculation.semantic_cache, "nearest", lambda provider, query: None)
+
+
+def _run(steps):
+    async def main():
+        prefetch = SpeculativePrefetch("Pune", STAGES, TOOLS, providers=["openai", "exa"])
+        for step in steps:
+            await step(prefetch)
+        return prefetch.close()
+
+    return asyncio.run(main())
+
+
+def _start(stage):
+    async def step(prefetch):
+        await prefetch.on_chain_start({}, {}, name=stage)
+    return step
+
+
+def _search(tool, query):
+    async def step(prefetch):
+        await prefetch.on_tool_start({}, query, inputs={"query": query}, name=tool)
+    return step
+
+
+def _wait(seconds):
+    async def step(prefetch):
+        await asyncio.sleep(seconds)
+    return step
+
+
+def test_confirmed_stage_that_never_searches_saves_nothing():
+    report = _run([_start(STAGES[0]), _wait(0.1), _start(STAGES[1]), _wait(0.01)])
+    calls = len(stage_queries("Pune", [STAGES[1]])[STAGES[1]]) * 2
+    assert report["confirmed"] == 1
+    assert report["used_calls"] == 0
+    assert report["head_start_seconds"] == 0
+    assert report["wasted_calls"] == calls
+
+
+def test_only_searches_the_stage_issued_are_credited():
+    query = stage_queries("Pune", [STAGES[1]])[STAGES[1]][0]
+    report = _run([
+        _start(STAGES[0]), _wait(0.1), _start(STAGES[1]),
+        _search("exa_search", query.upper() + "?"), _search("exa_search", "something else"),
+    ])
+    assert report["used_calls"] == 1
+    assert report["head_start_seconds"] == pytest.approx(0.05, abs=0.04)
+    assert report["wasted_calls"] == len(stage_queries("Pune", [STAGES[1]])[STAGES[1]]) * 2 - 1
+
+
+def test_misprediction_cancels_in_flight_searches():
+    report = _run([_start(STAGES[0]), _start(STAGES[2])])
+    assert report["mispredicted"] == 1
+    assert report["cancelled_calls"] == len(stage_queries("Pune", [STAGES[1]])[STAGES[1]]) * 2
+
+
+def test_semantic_cache_hits_on_prefetched_results_are_credited(monkeypatch):
+    query = stage_queries("Pune", [STAGES[1]])[STAGES[1]][0]
+    rephrased = "rephrasing of the first query"
+    monkeypatch.setattr(
+        speculation.semantic_cache, "nearest",
+        lambda provider, asked: (query, 0.9) if asked == rephrased else None,
+    )
+    report = _run([_start(STAGES[0]), _wait(0.1), _start(STAGES[1]), _search("exa_search", rephrased)])
+    assert report["used_calls"] == 1
+    assert report["wasted_calls"] == len(stage_queries("Pune", [STAGES[1]])[STAGES[1]]) * 2 - 1
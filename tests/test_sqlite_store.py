@@ -0,0 +1,28 @@
+import time
+
+from search_cache import SearchCache
+from stage_memo import StageMemo
+
+
+def test_lru_eviction_keeps_recently_read_entries(tmp_path):
+    memo = StageMemo(str(tmp_path / "memo.sqlite"), max_bytes=300)
+    for key in ["a", "b", "c"]:
+        memo.set("stage", key, {"output": "x" * 80})
+        time.sleep(0.01)
+    # Reading "a" makes "b" the least recently used
+    assert memo.get("stage", "a") is not None
+    memo.set("stage", "d", {"output": "x" * 80})
+    assert memo.get("stage", "b") is None
+    assert all(memo.get("stage", key) is not None for key in ["a", "c", "d"])
+    assert memo.stats()["bytes"] <= 300
+
+
+def test_expired_entries_are_evicted_first(tmp_path):
+    cache = SearchCache(str(tmp_path / "cache.sqlite"), max_bytes=250, ttls={"exa": -1, "openai": 3600})
+    cache.set("openai", "old but live", "x" * 80)
+    time.sleep(0.01)
+    cache.set("exa", "expired", "x" * 80)
+    cache.set("openai", "new", "x" * 80)
+    cache.set("openai", "newest", "x" * 80)
+    assert cache.get("openai", "old but live") is not None
+    assert cache.stats()["entries"] == 3
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from surrogate import TARGET_STAGE, TARGETS, FuelPropertySurrogate
+from workflow_state import FuelComposition
+
+DEFAULTS = {"r4_negative_pressure": 100.0, "r4_temperature": 230.0, "r4_retention_time": 600.0}
+
+
+def _properties(plastic, temperature, noise=0.0):
+    return FuelComposition(**{t: 10 + 0.2 * plastic + 0.01 * temperature + i + noise for i, t in enumerate(TARGETS)})
+
+
+@pytest.fixture
+def surrogate(tmp_path):
+    return FuelPropertySurrogate(str(tmp_path / "surrogate.sqlite"))
+
+
+@pytest.fixture
+def trained(surrogate):
+    rng = np.random.default_rng(0)
+    for _ in range(60):
+        plastic, temperature = rng.uniform(30, 70), rng.uniform(200, 260)
+        parameters = {**DEFAULTS, "r4_temperature": temperature}
+        surrogate.log(
+            {"Plastic": plastic, "paper": 100 - plastic}, parameters,
+            _properties(plastic, temperature, rng.normal(0, 0.05)), TARGET_STAGE,
+        )
+    return surrogate
+
+
+def test_repeated_runs_are_one_sample(surrogate):
+    for _ in range(30):
+        surrogate.log({"plastic": 50, "paper": 50}, DEFAULTS, _properties(50, 230), TARGET_STAGE)
+    assert surrogate.stats()["samples"] == 1
+    prediction = surrogate.predict({"glass": 90, "wood": 10}, {**DEFAULTS, "r4_temperature": 300})
+    assert not prediction.confident and prediction.insufficient_data
+    assert "distinct samples" in prediction.reason
+    # Serializes cleanly: no placeholder properties or infinite std
+    assert prediction.model_dump(mode="json")["properties"] is None
+    assert prediction.std == {}
+
+
+def test_other_stages_are_not_trained_on(surrogate):
+    for plastic in range(30, 70):
+        surrogate.log({"plastic": plastic, "paper": 100 - plastic}, DEFAULTS, _properties(plastic, 230), "R4_process_engineer")
+    assert surrogate.stats()["samples"] == 0
+    assert not surrogate.predict({"plastic": 50, "paper": 50}, DEFAULTS).confident
+
+
+def test_confident_inside_the_training_range(trained):
+    prediction = trained.predict({"plastic": 50, "paper": 50}, DEFAULTS)
+    assert prediction.confident and not prediction.insufficient_data
+    assert prediction.properties.model_dump() == pytest.approx(_properties(50, 230).model_dump(), abs=0.2)
+    assert all(std > 0 for std in prediction.std.values())
+
+
+def test_unconfident_when_extrapolating(trained):
+    prediction = trained.predict({"plastic": 95, "paper": 5}, DEFAULTS)
+    assert not prediction.confident
+    assert "training range" in prediction.reason
+    assert not trained.predict({"plastic": 50, "paper": 50}, {**DEFAULTS, "r4_retention_time": 900}).confident
+    assert not trained.predict({"plastic": 50, "glass": 50}, DEFAULTS).confident
+
+
+def test_perfect_fit_still_has_a_noise_floor(surrogate):
+    for plastic in range(30, 70):
+        surrogate.log({"plastic": plastic, "paper": 100 - plastic}, DEFAULTS, _properties(plastic, 230), TARGET_STAGE)
+    prediction = surrogate.predict({"plastic": 50, "paper": 50}, DEFAULTS)
+    assert all(std > 0 for std in prediction.std.values())
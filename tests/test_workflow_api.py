@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_openai.chat_models.base import BaseChatOpenAI
+
+import agent
+
+STAGE_OUTPUT = {
+    "composition": [{"name": "plastic", "percent": 60.0}, {"name": "paper", "percent": 40.0}],
+    "removed": [],
+    "citations": [],
+    "fuel_properties": None,
+    "summary": "Sorted the plastics.",
+}
+
+
+@pytest.fixture
+def model(monkeypatch):
+    # Stands in for the chat model: fails while `down` is set, else answers (and emits the stage output)
+    calls = {"down": False}
+
+    async def agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if calls["down"]:
+            raise RuntimeError("provider unavailable")
+        if "response_format" in kwargs:
+            message = AIMessage(content=json.dumps(STAGE_OUTPUT), additional_kwargs={"parsed": STAGE_OUTPUT})
+        else:
+            message = AIMessage(content="Stage report.")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    monkeypatch.setattr(BaseChatOpenAI, "_agenerate", agenerate)
+    return calls
+
+
+def test_failed_run_returns_its_thread_id_and_resumes(model):
+    request = {"message": "Plastic 60%, paper 40%", "mode": "pipeline", "stages": ["sorting_supervisor"]}
+    with TestClient(agent.app) as client:
+        model["down"] = True
+        failed = client.post("/workflow", json=request)
+        assert failed.status_code == 500
+        thread_id = failed.json()["detail"]["thread_id"]
+        assert thread_id and failed.headers["X-Thread-Id"] == thread_id
+        assert "provider unavailable" in failed.json()["detail"]["error"]
+
+        model["down"] = False
+        resumed = client.post(f"/workflow/{thread_id}/resume")
+        assert resumed.status_code == 200
+        assert resumed.json()["thread_id"] == thread_id
+        assert resumed.json()["composition"]["composition"] == {"plastic": 60.0, "paper": 40.0}
+
+
+@pytest.mark.parametrize("with_kb", [False, True])
+def test_research_first_prompts_name_no_web_tools(monkeypatch, with_kb):
+    monkeypatch.setattr(agent, "kb_tools", [agent.local_kb_search] if with_kb else [])
+    for name in agent.STAGES:
+        prompt = agent.agent_prompt(name, web_search=False)
+        for line in agent.SEARCH_TOOL_PROMPT_LINES.values():
+            assert line not in prompt
+        assert "web search tools" not in prompt
+        assert ("local_kb_search" in prompt) == with_kb
+
+
+def test_prompts_name_only_the_tools_offered():
+    prompt = agent.agent_prompt("R4_process_engineer")
+    assert "**meta_search**" in prompt and "**search_engine_openai**" in prompt
+    assert "**exa_search**" not in prompt and "**search_engine_duckduckgo**" not in prompt
+
+
+@pytest.mark.parametrize("place", [None, "  ", agent.PLACE_PLACEHOLDER])
+def test_research_pipeline_needs_a_place(model, place):
+    with pytest.raises(ValueError, match="needs a place"):
+        asyncio.run(agent.app_research_pipeline.ainvoke(
+            {"messages": [{"role": "user", "content": "Plastic 60%, paper 40%"}]},
+            {"configurable": {"place": place}},
+        ))
@@ -0,0 +1,40 @@
+from openai.lib._parsing._completions import type_to_response_format_param
+
+from workflow_state import ComponentShare, CompositionState, StageOutput
+
+
+def _objects(schema):
+    # Every object schema nested anywhere in a JSON schema
+    if isinstance(schema, dict):
+        if schema.get("type") == "object":
+            yield schema
+        for value in schema.values():
+            yield from _objects(value)
+    elif isinstance(schema, list):
+        for value in schema:
+            yield from _objects(value)
+
+
+def test_stage_output_schema_is_valid_in_strict_mode():
+    # The response format the OpenAI client sends for the stage agents' structured output
+    response_format = type_to_response_format_param(StageOutput)
+    assert response_format["json_schema"]["strict"] is True
+    objects = list(_objects(response_format["json_schema"]["schema"]))
+    assert objects
+    for schema in objects:
+        # Strict mode only accepts closed objects whose properties are all required
+        assert schema.get("additionalProperties") is False, schema.get("title")
+        assert set(schema.get("required", [])) == set(schema.get("properties", {})), schema.get("title")
+
+
+def test_apply_folds_component_shares_into_mappings():
+    state = CompositionState(composition={"plastic": 50.0, "paper": 30.0, "metal": 20.0})
+    output = StageOutput(
+        composition=[ComponentShare(name="plastic", percent=62.5), ComponentShare(name="paper", percent=37.5)],
+        removed=[ComponentShare(name="metal", percent=20.0)],
+        summary="Removed the metals.",
+    )
+    updated = state.apply("magnet", output)
+    assert updated.composition == {"plastic": 62.5, "paper": 37.5}
+    assert updated.removed == {"magnet": {"metal": 20.0}}
+    assert updated.inputs == {"magnet": state.composition}
@@ -0,0 +1,100 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from results import Citation, dedupe_citations
+
+
+class FuelComposition(BaseModel):
+    calorific_value: float
+    moisture: float
+    chlorine: float
+    ash: float
+    particle_size_uniformity: float
+
+
+class ComponentShare(BaseModel):
+    name: str
+    percent: float
+
+
+def shares(components: List[ComponentShare]) -> Dict[str, float]:
+    """
+    Turn a list of component shares back into a name to percentage mapping.
+    Args:
+        components (List[ComponentShare]): The shares as the agent reported them.
+    Returns:
+        Dict[str, float]: Component name to percentage; a repeated name keeps its last value.
+    """
+    return {component.name: component.percent for component in components}
+
+
+# Mappings are reported as lists of shares: OpenAI's strict structured output rejects
+# free-form objects (additionalProperties with a schema), so Dict fields can't be used here
+class StageOutput(BaseModel):
+    """
+    What a stage reports back, as structured output of its agent.
+    """
+    composition: List[ComponentShare] = Field(
+        description="Waste composition after this stage: each component with its percentage, normalized to 100."
+    )
+    removed: List[ComponentShare] = Field(
+        default_factory=list,
+        description="Percentage points removed by this stage per component, relative to this stage's input.",
+    )
+    citations: List[Citation] = Field(default_factory=list, description="Sources used by this stage.")
+    fuel_properties: Optional[FuelComposition] = Field(
+        default=None, description="Fuel properties, only for stages that produce or change the solid fuel."
+    )
+    summary: str = Field(description="Two or three sentences on what this stage did and why.")
+
+
+# CompositionState fields the agents never see
+BOOKKEEPING_FIELDS = {"inputs", "fuel_properties_stage", "replayed"}
+
+
+class CompositionState(BaseModel):
+    """
+    Composition carried between pipeline stages in place of each stage's prose report.
+    """
+    composition: Dict[str, float]
+    removed: Dict[str, Dict[str, float]] = {}
+    citations: List[Citation] = []
+    fuel_properties: Optional[FuelComposition] = None
+    # Bookkeeping for the fuel property surrogate's training data, not shown to the agents:
+    # each stage's input composition, the stage that reported fuel_properties, and the stages
+    # whose output was replayed from the stage memo rather than produced by this run
+    inputs: Dict[str, Dict[str, float]] = {}
+    fuel_properties_stage: Optional[str] = None
+    replayed: List[str] = []
+
+    def apply(self, stage: str, output: StageOutput, replayed: bool = False) -> "CompositionState":
+        """
+        Fold one stage's output into the state.
+        Args:
+            stage (str): The stage that produced the output.
+            output (StageOutput): The stage's structured output.
+            replayed (bool): Whether the output came from the stage memo.
+        Returns:
+            CompositionState: The updated state; self is left unchanged.
+        """
+        return CompositionState(
+            composition=shares(output.composition),
+            removed={**self.removed, stage: shares(output.removed)},
+            citations=dedupe_citations(self.citations + output.citations),
+            fuel_properties=output.fuel_properties or self.fuel_properties,
+            inputs={**self.inputs, stage: self.composition},
+            fuel_properties_stage=stage if output.fuel_properties else self.fuel_properties_stage,
+            replayed=self.replayed + [stage] if replayed else self.replayed,
+        )
+
+
+STAGE_OUTPUT_PROMPT = """
+Extract the result of the stage you just completed from the conversation above.
+- composition: every component of the waste composition after this stage as a name and its percentage, normalized to 100.
+- removed: the percentage points removed from each component by this stage, as a name and percentage each (omit components that were not touched).
+- citations: the source links you used.
+- fuel_properties: only if this stage produced or changed the solid fuel (R4 machine, water bath).
+- summary: a short account of what the stage did.
+Use the numbers from your final answer; do not recompute or invent values.
+"""